@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Only the async serving mode needs httpx
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AmadeusError(Exception):
+    """Raised when the Amadeus API answers with a non-2xx status."""
+
+    def __init__(self, status_code, message=None, detail=None):
+        self.status_code = status_code
+        self.detail = detail  # First error detail from the response body, if any
+        super().__init__(message or f"Amadeus API error: {status_code}")
+
+
+def authorization_digest(authorization):
+    """Stable digest of an Authorization header, to key on without keeping the token."""
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+
+def error_detail(response):
+    try:
+        return response.json()["errors"][0].get("detail")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+TOKEN_PATH = "/v1/security/oauth2/token"
+AIRPORT_SEARCH_PATH = "/v1/reference-data/locations"
+FLIGHT_DELAY_PATH = "/v1/travel/predictions/flight-delay"
+# How long a caller's token counts as valid after Amadeus last accepted it
+ACCEPTED_TOKEN_TTL = 300
+MAX_TRUSTED_TOKENS = 10000
+
+
+def _token_form(client_id, client_secret):
+    return {
+        "grant_type": "client_credentials",
+        "client_id": client_id,
+        "client_secret": client_secret
+    }
+
+
+# OAuth tokens cached per (endpoint, client id, secret) until shortly before
+# they expire. Shared by the blocking and the async client. The client also
+# remembers which Authorization headers are known to be valid, either issued
+# here or recently accepted by Amadeus, so routes only answer from their
+# shared caches for callers holding a checked token.
+class _TokenCache:
+    def __init__(self, refresh_margin):
+        self.refresh_margin = refresh_margin
+        self._tokens = {}  # Cache key -> (token payload, monotonic expiry time)
+        self._trusted = {}  # SHA-256 of an Authorization header -> monotonic expiry time
+
+    @staticmethod
+    def _token_key(api_endpoint, client_id, client_secret):
+        # Never keep the raw secret around as a dictionary key
+        secret = hashlib.sha256(client_secret.encode("utf-8")).hexdigest()
+        return (api_endpoint.rstrip("/"), client_id, secret)
+
+    def _cached_token(self, key):
+        entry = self._tokens.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        remaining = expires_at - time.monotonic()
+        if remaining <= self.refresh_margin:
+            return None
+        return dict(payload, expires_in=int(remaining))
+
+    def _trust(self, authorization, ttl):
+        now = time.monotonic()
+        if len(self._trusted) >= MAX_TRUSTED_TOKENS:
+            for key, expires_at in list(self._trusted.items()):
+                if expires_at <= now:
+                    self._trusted.pop(key, None)
+        self._trusted[authorization_digest(authorization)] = now + ttl
+
+    def trusts(self, authorization):
+        """Whether the Authorization header carries a token issued here or recently accepted by Amadeus."""
+        expires_at = self._trusted.get(authorization_digest(authorization or ""))
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def _store_token(self, key, client_id, payload):
+        expires_in = int(payload.get("expires_in", 0))
+        self._tokens[key] = (payload, time.monotonic() + expires_in)
+        if payload.get("access_token"):
+            self._trust(f"Bearer {payload['access_token']}", expires_in)
+        logging.debug(f"Fetched Amadeus token for {client_id}, valid for {expires_in}s")
+        return dict(payload)
+
+    def invalidate_token(self, api_endpoint, client_id, client_secret):
+        self._tokens.pop(self._token_key(api_endpoint, client_id, client_secret), None)
+
+
+# Outbound client for the Amadeus API shared by every request of the process.
+# One pooled requests.Session keeps connections (and their TLS sessions) alive
+# between calls, and OAuth tokens are cached until shortly before they expire.
+# When a token needs refreshing only one thread calls the token endpoint;
+# concurrent callers wait for its result.
+class AmadeusClient(_TokenCache):
+    def __init__(self, connect_timeout=3.05, read_timeout=10, refresh_margin=60, pool_size=20):
+        super().__init__(refresh_margin)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._refresh_locks = {}
+        self._guard = threading.Lock()
+
+    def _refresh_lock(self, key):
+        with self._guard:
+            return self._refresh_locks.setdefault(key, threading.Lock())
+
+    def get_token(self, api_endpoint, client_id, client_secret):
+        """Return a token payload (access_token, token_type, expires_in) for the credentials."""
+        key = self._token_key(api_endpoint, client_id, client_secret)
+        token = self._cached_token(key)
+        if token is not None:
+            return token
+        with self._refresh_lock(key):
+            # Another thread may have refreshed while we waited for the lock
+            token = self._cached_token(key)
+            if token is not None:
+                return token
+            payload = self._fetch_token(api_endpoint, client_id, client_secret)
+            return self._store_token(key, client_id, payload)
+
+    def _fetch_token(self, api_endpoint, client_id, client_secret):
+        response = self.session.post(
+            f"{api_endpoint.rstrip('/')}{TOKEN_PATH}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data=_token_form(client_id, client_secret),
+            timeout=self.timeout
+        )
+        if not response.ok:
+            raise AmadeusError(response.status_code)
+        return response.json()
+
+    def get(self, api_endpoint, path, authorization, params=None):
+        """GET an Amadeus resource with a caller-supplied Authorization header and return the raw response."""
+        response = self.session.get(
+            f"{api_endpoint.rstrip('/')}{path}",
+            headers={"Authorization": authorization},
+            params=params,
+            timeout=self.timeout
+        )
+        if not response.ok:
+            raise AmadeusError(response.status_code, detail=error_detail(response))
+        self._trust(authorization, ACCEPTED_TOKEN_TTL)
+        return response
+
+    def search_airports(self, api_endpoint, authorization, keyword):
+        return self.get(api_endpoint, AIRPORT_SEARCH_PATH, authorization,
+                        params={"subType": "AIRPORT", "keyword": keyword})
+
+    def predict_flight_delay(self, api_endpoint, authorization, params):
+        return self.get(api_endpoint, FLIGHT_DELAY_PATH, authorization, params=params)
+
+
+# Non-blocking counterpart of AmadeusClient for the async serving mode. Calls
+# are awaited on the event loop over one pooled httpx.AsyncClient, so a
+# pending round trip does not hold a worker thread. Token refreshes are
+# serialised per credentials with an asyncio.Lock instead of a thread lock.
+class AsyncAmadeusClient(_TokenCache):
+    def __init__(self, connect_timeout=3.05, read_timeout=10, refresh_margin=60, pool_size=100):
+        if httpx is None:
+            raise RuntimeError("The async serving mode requires httpx")
+        super().__init__(refresh_margin)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self._refresh_locks = {}
+
+    async def get_token(self, api_endpoint, client_id, client_secret):
+        key = self._token_key(api_endpoint, client_id, client_secret)
+        token = self._cached_token(key)
+        if token is not None:
+            return token
+        async with self._refresh_locks.setdefault(key, asyncio.Lock()):
+            token = self._cached_token(key)
+            if token is not None:
+                return token
+            response = await self.client.post(
+                f"{api_endpoint.rstrip('/')}{TOKEN_PATH}",
+                data=_token_form(client_id, client_secret)
+            )
+            if not response.is_success:
+                raise AmadeusError(response.status_code)
+            return self._store_token(key, client_id, response.json())
+
+    async def get(self, api_endpoint, path, authorization, params=None):
+        response = await self.client.get(
+            f"{api_endpoint.rstrip('/')}{path}",
+            headers={"Authorization": authorization},
+            params=params
+        )
+        if not response.is_success:
+            raise AmadeusError(response.status_code, detail=error_detail(response))
+        self._trust(authorization, ACCEPTED_TOKEN_TTL)
+        return response
+
+    async def search_airports(self, api_endpoint, authorization, keyword):
+        return await self.get(api_endpoint, AIRPORT_SEARCH_PATH, authorization,
+                              params={"subType": "AIRPORT", "keyword": keyword})
+
+    async def predict_flight_delay(self, api_endpoint, authorization, params):
+        return await self.get(api_endpoint, FLIGHT_DELAY_PATH, authorization, params=params)
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,308 @@
+# Async serving mode for the backend:
+#
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+#
+# The /amadeus/* proxy routes and /weather run natively on the event loop:
+# outbound calls go through AsyncAmadeusClient and AsyncWeatherClient, so a
+# request waiting on Amadeus or OpenWeatherMap holds no thread. Every other
+# route, /query included, is the unchanged Flask app
+# mounted as WSGI and run in a bounded thread pool (ASGI_WSGI_WORKERS). That
+# pool is where the CPU-bound matching and scoring happens, so it never grows
+# with the number of open connections. Request and response bodies match the
+# Flask routes. RequestLogMiddleware assigns request ids and writes the access
+# log for both kinds of route alike.
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import backend
+from amadeus_client import AmadeusError, AsyncAmadeusClient, authorization_digest
+from log_pipeline import RequestLogMiddleware
+from weather_client import AsyncWeatherClient, format_weather
+
+AMADEUS = AsyncAmadeusClient(
+    connect_timeout=float(os.environ.get("AMADEUS_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.environ.get("AMADEUS_READ_TIMEOUT", "10")),
+    pool_size=int(os.environ.get("AMADEUS_POOL_SIZE", "100"))
+)
+WEATHER = AsyncWeatherClient(
+    connect_timeout=float(os.environ.get("WEATHER_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.environ.get("WEATHER_READ_TIMEOUT", "5"))
+)
+WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "8"))
+# RequestLogMiddleware logs every request, including those Flask serves
+backend.app.config["ACCESS_LOG"] = False
+
+
+# Outbound call timing for the async clients, into the same histogram as the
+# blocking clients' session hooks
+async def start_outbound_timer(request):
+    request.extensions["started"] = time.perf_counter()
+
+
+def outbound_observer(service):
+    async def observe_outbound(response):
+        started = response.request.extensions.get("started")
+        if started is not None:
+            backend.OUTBOUND_SECONDS.observe(time.perf_counter() - started, service=service,
+                                             path=urlparse(str(response.request.url)).path, status=response.status_code)
+    return observe_outbound
+
+
+AMADEUS.client.event_hooks = {"request": [start_outbound_timer], "response": [outbound_observer("amadeus")]}
+WEATHER.client.event_hooks = {"request": [start_outbound_timer], "response": [outbound_observer("openweather")]}
+
+
+# Times the native routes like backend.observe_request times the Flask ones
+def timed_route(endpoint):
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            response = await handler(request)
+            backend.HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                         method=request.method, status=response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+
+def json_response(body, status_code=200):
+    return Response(backend.dumps(body), status_code=status_code, media_type="application/json")
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@timed_route("/amadeus/token")
+async def get_amadeus_token(request):
+    try:
+        data = await read_json(request) or {}
+        client_id = data.get("client_id")
+        client_secret = data.get("client_secret")
+        api_endpoint = data.get("api_endpoint")
+
+        if not all([client_id, client_secret, api_endpoint]):
+            return json_response({"error": "Missing credentials"}, 400)
+
+        return json_response(await AMADEUS.get_token(api_endpoint, client_id, client_secret))
+    except AmadeusError as e:
+        return json_response({"error": str(e)}, e.status_code)
+    except Exception as e:
+        logging.error(f"Error getting Amadeus token: {str(e)}")
+        return json_response({"error": str(e)}, 500)
+
+
+@timed_route("/amadeus/airport-search")
+async def search_airport(request):
+    try:
+        query = request.query_params.get("query")
+        token = request.headers.get("Authorization")
+        api_endpoint = request.query_params.get("api_endpoint")
+
+        if not all([query, token, api_endpoint]):
+            return json_response({"error": "Missing parameters"}, 400)
+
+        key = backend.airport_search_key(api_endpoint, query)
+
+        async def load():
+            response = await AMADEUS.search_airports(api_endpoint, token, key[1])
+            return response.content
+
+        # Same cache as the Flask route, so both modes share autocomplete
+        # results; only callers with a checked token read the shared entry
+        shared = AMADEUS.trusts(token)
+        body = await backend.AIRPORT_SEARCH_CACHE.get_or_load_async(key if shared else key + (authorization_digest(token),), load)
+        if not shared:
+            backend.AIRPORT_SEARCH_CACHE.set(key, body)
+        return Response(body, media_type="application/json")
+    except AmadeusError as e:
+        return json_response({"error": str(e)}, e.status_code)
+    except Exception as e:
+        logging.error(f"Error searching airports: {str(e)}")
+        return json_response({"error": str(e)}, 500)
+
+
+async def fetch_flight_delay(api_endpoint, authorization, params):
+    await backend.FLIGHT_DELAY_LIMITER.acquire_async()
+    try:
+        response = await AMADEUS.predict_flight_delay(api_endpoint, authorization, params)
+    except AmadeusError as e:
+        prediction = backend.untrained_prediction(e)
+        if prediction is None:
+            raise
+        return prediction
+    return backend.first_prediction(response.json())
+
+
+@timed_route("/amadeus/flight-delay/batch")
+async def predict_flight_delays(request):
+    """Event-loop version of backend.predict_flight_delays; same NDJSON stream."""
+    data = await read_json(request) or {}
+    token = request.headers.get("Authorization")
+    api_endpoint = data.get("api_endpoint")
+    segments = data.get("segments")
+
+    if not token or not api_endpoint or not isinstance(segments, list):
+        return json_response({"error": "Missing parameters"}, 400)
+    if len(segments) > backend.MAX_DELAY_SEGMENTS:
+        return json_response({"error": f"At most {backend.MAX_DELAY_SEGMENTS} segments per request"}, 400)
+    try:
+        groups = backend.group_delay_segments(api_endpoint, segments)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    cache = backend.FLIGHT_DELAY_CACHE
+    # Shared predictions are only read with a checked token, as in the Flask route
+    scope = () if AMADEUS.trusts(token) else (authorization_digest(token),)
+    ready = []
+    pending = {}
+    for key, (params, indexes) in groups.items():
+        key += scope
+        prediction = cache.get(key)
+        if prediction is not None:
+            ready.append((indexes, prediction))
+            continue
+        loader = lambda params=params: fetch_flight_delay(api_endpoint, token, params)
+        pending[asyncio.ensure_future(cache.get_or_load_async(key, loader))] = indexes
+
+    # Loads keep running if the client goes away, so their results still land
+    # in the cache; retrieve errors here so unread ones are not logged as lost
+    for task in pending:
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def generate():
+        for indexes, prediction in ready:
+            yield backend.delay_line(indexes, prediction)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                indexes = pending.pop(task)
+                try:
+                    prediction = task.result()
+                except Exception as e:
+                    prediction = backend.failed_prediction(e)
+                yield backend.delay_line(indexes, prediction)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def fetch_coordinates(api_endpoint, authorization, iata_code):
+    response = await AMADEUS.search_airports(api_endpoint, authorization, iata_code)
+    return backend.airport_coordinates(response.json(), iata_code)
+
+
+async def airport_weather(api_endpoint, authorization, api_key, iata_code, bucket, ttl):
+    """Event-loop version of backend.airport_weather, sharing its caches."""
+    async def fetch_weather():
+        coordinates = await backend.AIRPORT_COORDINATES_CACHE.get_or_load_async(
+            iata_code, lambda: fetch_coordinates(api_endpoint, authorization, iata_code))
+        weather = await WEATHER.current(api_key, coordinates["lat"], coordinates["lon"])
+        return format_weather(weather, coordinates, iata_code)
+
+    return await backend.WEATHER_CACHE.get_or_load_async((iata_code, bucket), fetch_weather, ttl=ttl)
+
+
+@timed_route("/weather")
+async def weather_batch(request):
+    """Event-loop version of backend.weather_batch; same body and timeout."""
+    try:
+        data = await read_json(request) or {}
+        token = request.headers.get("Authorization")
+        try:
+            api_endpoint, api_key, codes = backend.weather_params(data, token)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+
+        bucket, ttl = backend.weather_bucket()
+        tasks = {
+            asyncio.ensure_future(airport_weather(api_endpoint, token, api_key, code, bucket, ttl)): code
+            for code in codes
+        }
+        # Lookups past the timeout keep running and still fill the cache
+        for task in tasks:
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        done, _ = await asyncio.wait(tasks, timeout=backend.WEATHER_BATCH_TIMEOUT)
+
+        results = {}
+        for task, code in tasks.items():
+            if task not in done:
+                results[code] = {"error": "Weather lookup timed out"}
+                continue
+            try:
+                results[code] = task.result()
+            except Exception as e:
+                results[code] = backend.failed_weather(code, e)
+        return json_response({"results": results})
+    except Exception as e:
+        logging.error(f"Error in weather lookup: {str(e)}")
+        return json_response({"error": str(e)}, 500)
+
+
+# Stamps responses of the native routes with the loaded dataset version, as
+# the Flask after_request hook does for the routes it serves. Flask stamps the
+# version its request was pinned to, so responses on other paths, and any
+# response that already carries the header, are passed through unchanged.
+class DataVersionMiddleware:
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if not any(k.lower() == b"x-data-version" for k, _ in headers):
+                    headers.append((b"x-data-version", backend.DATASET.version.encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await AMADEUS.aclose()
+    await WEATHER.aclose()
+
+
+# Routes served natively on the event loop; everything else goes to Flask
+NATIVE_ROUTES = [
+    Route("/amadeus/token", get_amadeus_token, methods=["POST"]),
+    Route("/amadeus/airport-search", search_airport, methods=["GET"]),
+    Route("/amadeus/flight-delay/batch", predict_flight_delays, methods=["POST"]),
+    Route("/weather", weather_batch, methods=["POST"])
+]
+
+app = Starlette(
+    routes=NATIVE_ROUTES + [Mount("/", app=WSGIMiddleware(backend.app, workers=WSGI_WORKERS))],
+    middleware=[
+        Middleware(RequestLogMiddleware),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+        Middleware(DataVersionMiddleware, paths=[route.path for route in NATIVE_ROUTES])
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("asgi:app", host="0.0.0.0", port=5000)
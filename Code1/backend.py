@@ -1,14 +1,48 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g
 from flask_cors import CORS
 import pandas as pd
 import os
 import logging
+import mmap
+import re
+from collections.abc import Mapping, Sequence
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta, time
-from fuzzywuzzy import fuzz, process
-import requests
+from time import perf_counter
+from functools import partial
+from urllib.parse import quote, urlparse
 import json
-import traceback  # Add this import at the top of the file
+import hashlib
+import hmac
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer  # Add this import
+from amadeus_client import AmadeusClient, AmadeusError, authorization_digest
+from ttl_cache import TTLCache
+from rate_limiter import TokenBucket
+from itinerary_risk import score_itineraries
+from weather_client import WeatherClient, WeatherError, format_weather
+from metrics import REGISTRY, Collected, Histogram, set_labels
+from log_pipeline import configure_logging, init_request_ids, parse_sample_rates
+from fuzzy_match import FuzzyMatcher, default_process
+from list_cursor import decode_cursor, encode_cursor
+from workbook import LazyDict, WorkbookSnapshot, clean_record, load_sheets
+from airport_registry import AirportRegistry
+from session_store import SessionStore
+from intent_router import INTENT_TABLE, IntentRouter
+from country_registry import GCC_EXEMPT, NOT_ELIGIBLE, VISA_ON_ARRIVAL, CountryRegistry, build_visa_eligibility
+from transport_index import TransportSearchIndex
+from train_network import TrainNetwork
+
+# Only the mapped data mode needs pyarrow's IPC files and memory maps
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
 
 # Custom JSON encoder to handle datetime.time objects
 class CustomJSONEncoder(json.JSONEncoder):
@@ -21,125 +55,671 @@ app = Flask(__name__)
 app.json_encoder = CustomJSONEncoder  # Use our custom encoder
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
-# Load Excel file once
-DATA_FILE = "Airport details.xlsx"
-DATA = pd.ExcelFile(DATA_FILE)
-
-# Now define SHEETS with the specially handled DataFrame
-SHEETS = {
-    "Bangalore": {
-        "facilities": DATA.parse("Bangalore airport facilities"),
-        "transport": {
-            "bus": DATA.parse("Bangalore bus"),
-            "car rental": DATA.parse("Bangalore car rental"),
-            "taxis": DATA.parse("Bangalore taxis"),
-            "train": DATA.parse("Bangalore Train"),
-            "services": DATA.parse("Bangalore Transport service")
-        },
-        "visa": DATA.parse("Visa on Arrival Bangalore")
-    },
-    "Dubai": {
-        "facilities": DATA.parse("Dubai Airport facilities"),
-        "transport": {
-            "metro": DATA.parse("Dubai metro"),
-            "car rental": DATA.parse("Dubai car rental"),
-            "services": DATA.parse("Dubai Transport services")
-        },
-        "visa": DATA.parse("Visa on Arrival Dubai"),
-        "GCC": DATA.parse("GCC")
-    }
-}
+# Configure logging. Records are written by a background thread, and DEBUG
+# records of the per-request loggers below are sampled; LOG_SAMPLE takes
+# "logger=rate" pairs, e.g. "backend.query=1" to see every query again.
+DEFAULT_LOG_SAMPLE = "backend.query=0.05,backend.sessions=0.05,backend.transport=0.1,backend.facilities=0.1"
+LOG_HANDLER = configure_logging(
+    level=os.environ.get("LOG_LEVEL", "DEBUG"),
+    fmt=os.environ.get("LOG_FORMAT", "text"),
+    sample_rates=parse_sample_rates(os.environ.get("LOG_SAMPLE", DEFAULT_LOG_SAMPLE)),
+    queue_size=int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+)
+init_request_ids(app)
+QUERY_LOG = logging.getLogger("backend.query")
+SESSION_LOG = logging.getLogger("backend.sessions")
+TRANSPORT_LOG = logging.getLogger("backend.transport")
+FACILITIES_LOG = logging.getLogger("backend.facilities")
+
+# Compact JSON encoding to bytes, using orjson when it is installed
+try:
+    import orjson
+
+    def dumps(value):
+        return orjson.dumps(value, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def dumps(value):
+        return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Process-wide latency metrics, served at /metrics
+DATA_LOAD_SECONDS = Histogram(
+    "chatbot_data_load_seconds", "Time spent loading the workbook and building sheets and indexes.",
+    ["step"], buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+HANDLER_SECONDS = Histogram("chatbot_handler_seconds", "Time spent in a /query handler, by the branch it took.", ["handler", "branch"])
+JSON_SECONDS = Histogram("chatbot_json_seconds", "Time spent serializing JSON responses.", ["encoder"])
+HTTP_SECONDS = Histogram("chatbot_http_request_seconds", "Time to produce a response, by route.", ["endpoint", "method", "status"])
+OUTBOUND_SECONDS = Histogram("chatbot_outbound_request_seconds", "Time until response headers of outbound API calls.", ["service", "path", "status"])
+
+# Flask 2.2+ serializes jsonify() replies through a JSON provider; time it there
+if hasattr(Flask, "json_provider_class"):
+    class TimedJSONProvider(Flask.json_provider_class):
+        def dumps(self, obj, **kwargs):
+            with JSON_SECONDS.time(encoder="jsonify"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+# Location of the workbook holding all airport data, resolved next to this
+# file so the server can be started from any working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.environ.get("AIRPORT_DATA_FILE", os.path.join(BASE_DIR, "Airport details.xlsx"))
+SNAPSHOT_DIR = os.environ.get("AIRPORT_SNAPSHOT_DIR", os.path.join(BASE_DIR, ".snapshots"))
+# "private": every worker reads sheets from the Parquet snapshot into its own
+# DataFrames. "mapped": workers memory-map a compiled, read-only copy of the
+# sheets and their encoded rows, so all workers on a box share one copy
+# through the page cache (start the server with --preload to map it once).
+DATA_MODE = os.environ.get("AIRPORT_DATA_MODE", "private")
+
+# Manifest of supported airports and the workbook sheets behind each one
+MANIFEST_FILE = os.environ.get("AIRPORT_MANIFEST", os.path.join(BASE_DIR, "airports.json"))
+# Approximate memory allowed for loaded airports before the coldest are dropped
+AIRPORT_MEMORY_BUDGET = int(float(os.environ.get("AIRPORT_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+
+# The workbook snapshot as read by the default "private" data mode, with its
+# load steps timed and the encoded rows the list replies are built from
+class PrivateSnapshot(WorkbookSnapshot):
+    @DATA_LOAD_SECONDS.timed(step="ingest")
+    def _ingest(self):
+        super()._ingest()
+
+    @DATA_LOAD_SECONDS.timed(step="read_sheet")
+    def read(self, sheet_name):
+        return super().read(sheet_name)
+
+    def payloads(self, sheets, layout):
+        """Encoded rows of an airport's sheets, mirroring its layout."""
+        return build_payloads(sheets)
+
+# A sheet's rows cleaned and JSON-encoded once per data version. Each record
+# keeps its encoded fragment, so any list response (a whole sheet or a subset
+# picked by an index) is assembled by joining bytes instead of re-serializing.
+class SheetPayload:
+    @DATA_LOAD_SECONDS.timed(step="encode_sheet")
+    def __init__(self, df):
+        self.records = [clean_record(row) for row in df.to_dict(orient="records")]
+        self.fragments = [dumps(record) for record in self.records]
+        self.list_body = list_body(self.fragments)
+
+def build_payloads(sheets):
+    def build(key):
+        value = sheets[key]
+        return build_payloads(value) if isinstance(value, Mapping) else SheetPayload(value)
+    return LazyDict({key: partial(build, key) for key in sheets})
+
+# Body of a {"response": [...], "type": "list"} reply built from encoded records
+@JSON_SECONDS.timed(encoder="list_body")
+def list_body(fragments, **extra):
+    body = b'{"response":[' + b",".join(fragments) + b'],"type":"list"'
+    for key, value in sorted(extra.items()):
+        body += b"," + dumps(key) + b":" + dumps(value)
+    return body + b"}"
+
+# List replies are paged. A /query client may send "limit" (LIST_PAGE_SIZE by
+# default) and gets "next_cursor" and "total" while records remain; posting
+# that cursor to /query returns the next page of the same listing (see
+# list_cursor). With "stream": true the records are written as NDJSON lines
+# as they are produced, each {"record": {...}}, then one
+# {"type": "list_end", ...} line with the cursor.
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", "50"))
+MAX_LIST_PAGE_SIZE = 500
+STREAM_CHUNK_RECORDS = 64
+
+class Paging:
+    def __init__(self, version, listing, offset=0, limit=LIST_PAGE_SIZE, stream=False):
+        self.version = version
+        self.listing = listing  # (airport, query type, message)
+        self.offset = offset
+        self.limit = limit  # None streams the whole listing
+        self.stream = stream
+
+    @classmethod
+    def from_request(cls, data, version, listing, offset=0):
+        stream = data.get("stream") is True
+        limit = data.get("limit")
+        if isinstance(limit, int) and not isinstance(limit, bool) and limit > 0:
+            limit = min(limit, MAX_LIST_PAGE_SIZE)
+        else:
+            limit = None if stream else LIST_PAGE_SIZE
+        return cls(version, listing, offset, limit, stream)
+
+    def cursor(self, offset):
+        return encode_cursor(self.version, *self.listing, offset)
+
+def page(total):
+    """Positions of the requested page among total records, and the extra reply fields for it."""
+    paging = g.get("paging")
+    if paging is None:
+        return range(total), {}
+    start = min(paging.offset, total)
+    end = total if paging.limit is None else min(total, start + paging.limit)
+    if start == 0 and end == total:
+        return range(start, end), {}
+    return range(start, end), {"next_cursor": paging.cursor(end) if end < total else None, "total": total}
+
+def list_response(fragments, **extra):
+    paging = g.get("paging")
+    if paging is not None and paging.stream:
+        return stream_response(fragments, extra)
+    return app.response_class(list_body(fragments, **extra), mimetype="application/json")
+
+def stream_response(fragments, extra):
+    def generate():
+        chunk = []
+        for fragment in fragments:
+            chunk.append(b'{"record":' + fragment + b"}\n")
+            if len(chunk) == STREAM_CHUNK_RECORDS:
+                yield b"".join(chunk)
+                chunk = []
+        chunk.append(dumps(dict(extra, type="list_end")) + b"\n")
+        yield b"".join(chunk)
+    return app.response_class(generate(), mimetype="application/x-ndjson")
+
+# A sheet's encoded rows stored back to back in one file, each followed by a
+# comma, with an offsets array marking where each row starts. Both are
+# memory-mapped read-only, so every process reading the file shares one copy
+# through the page cache, and a whole-sheet list body is a single slice.
+class MappedFragments(Sequence):
+    def __init__(self, path):
+        self.offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        with open(path + ".fragments", "rb") as f:
+            # mmap cannot map an empty file
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    @staticmethod
+    def write(path, fragments):
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) + 1 for fragment in fragments], out=offsets[1:])
+        with open(path + ".fragments", "wb") as f:
+            for fragment in fragments:
+                f.write(fragment + b",")
+        np.save(path + ".offsets.npy", offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1]) - 1]
+
+    def joined(self):
+        """All fragments separated by commas, as one bytes object."""
+        return self.data[:max(int(self.offsets[-1]) - 1, 0)]
+
+# Records decoded from mapped fragments on access rather than held in memory
+class DecodedRecords(Sequence):
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [json.loads(fragment) for fragment in self.fragments[i]]
+        return json.loads(self.fragments[i])
+
+# SheetPayload over a compiled sheet: same records, fragments and list body,
+# backed by the memory-mapped files instead of per-process objects
+class MappedPayload:
+    def __init__(self, path):
+        self.fragments = MappedFragments(path)
+        self.records = DecodedRecords(self.fragments)
+
+    @property
+    def list_body(self):
+        return b'{"response":[' + self.fragments.joined() + b'],"type":"list"}'
+
+# Snapshot whose sheets are also compiled for the mapped data mode: each
+# sheet to an uncompressed Arrow IPC file, whose string columns are
+# contiguous buffers with offsets, and its cleaned rows to MappedFragments.
+# Sheets are then read as DataFrames of Arrow-backed columns pointing into
+# the mapped file, so no worker holds a private copy of the data. Sheets that
+# Arrow cannot represent are read from the snapshot as before.
+class MappedSnapshot(PrivateSnapshot):
+    def __init__(self, data_file, snapshot_dir):
+        if pa is None:
+            raise RuntimeError("The mapped data mode requires pyarrow")
+        super().__init__(data_file, snapshot_dir)
+        self.compiled = os.path.join(self.directory, "mapped")
+        if not os.path.isdir(self.compiled):
+            self._compile()
+
+    @DATA_LOAD_SECONDS.timed(step="compile")
+    def _compile(self):
+        logging.debug(f"Compiling snapshot {self.version} for memory mapping")
+        staging = tempfile.mkdtemp(prefix=".compile-", dir=self.directory)
+        try:
+            for sheet_name in self.sheet_names():
+                df = super().read(sheet_name)
+                path = os.path.join(staging, quote(sheet_name, safe=""))
+                try:
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    with pa.OSFile(path + ".arrow", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                except (pa.ArrowException, TypeError, ValueError) as e:
+                    logging.debug(f"Sheet '{sheet_name}' stays unmapped: {str(e)}")
+                    if os.path.exists(path + ".arrow"):
+                        os.remove(path + ".arrow")
+                MappedFragments.write(path, [dumps(clean_record(row)) for row in df.to_dict(orient="records")])
+            os.chmod(staging, 0o755)
+            # Published atomically, like the snapshot itself
+            os.rename(staging, self.compiled)
+        except OSError:
+            if not os.path.isdir(self.compiled):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @DATA_LOAD_SECONDS.timed(step="map_sheet")
+    def read(self, sheet_name):
+        path = os.path.join(self.compiled, quote(sheet_name, safe="")) + ".arrow"
+        if not os.path.exists(path):
+            return super().read(sheet_name)
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        df.attrs["mapped"] = True
+        return df
+
+    def payloads(self, sheets, layout):
+        # Read from the compiled files; the sheets themselves are not needed
+        return LazyDict({
+            key: partial(self.payloads, None, value) if isinstance(value, dict)
+            else partial(MappedPayload, os.path.join(self.compiled, quote(value, safe="")))
+            for key, value in layout.items()
+        })
+
+# Read-only TF-IDF search index over one airport's facilities sheet.
+# Built once when the workbook is loaded and never mutated afterwards, so it
+# can be shared by concurrent requests without locking.
+class FacilityIndex:
+    TEXT_COLUMNS = ["Type", "Name", "Description"]
+
+    def __init__(self, df, payload):
+        self.formatted = all(col in df.columns for col in self.TEXT_COLUMNS)
+        self.rows = payload.records
+        self.fragments = payload.fragments
+        if not self.formatted or df.empty:
+            self.vectorizer = None
+            self.matrix = None
+            self.types = []
+            return
+
+        combined_text = df["Type"].fillna('') + " " + df["Name"].fillna('') + " " + df["Description"].fillna('')
+        self.vectorizer = TfidfVectorizer(stop_words="english")
+        # Rows are L2-normalised by the vectorizer, so a dot product is the cosine similarity
+        self.matrix = self.vectorizer.fit_transform(combined_text.tolist())
+        self.types = df["Type"].fillna('').astype(str).str.lower().tolist()
+
+    def search(self, message, k=5):
+        """Return up to k (row id, score) pairs ranked by similarity to message."""
+        if self.matrix is None:
+            return []
+        query_vector = self.vectorizer.transform([message])
+        similarity_scores = (self.matrix @ query_vector.T).toarray().ravel()
+        k = min(k, len(similarity_scores))
+        # Partial selection of the top k, then sort just those k
+        top_indices = np.argpartition(-similarity_scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-similarity_scores[top_indices], kind="stable")]
+        return [(int(i), float(similarity_scores[i])) for i in top_indices]
+
+    def filter_by_type(self, keyword, k=5):
+        """Return the ids of the first k rows whose Type contains keyword."""
+        return [i for i, row_type in enumerate(self.types) if keyword in row_type][:k]
+
+# Free-text index over all transport sheets, keeping each record's encoded fragment
+def build_transport_index(transport_payloads):
+    payloads = list(transport_payloads.values())
+    return TransportSearchIndex(
+        (record for payload in payloads for record in payload.records),
+        (fragment for payload in payloads for fragment in payload.fragments)
+    )
+
+def build_train_network(transport, transport_payloads):
+    key = next((k for k in transport.keys() if "train" in k.lower()), None)
+    if key is None:
+        return None
+    payload = transport_payloads[key]
+    return TrainNetwork(transport[key], payload.records, payload.fragments)
+
+# Bundled country registry used to validate visa queries
+COUNTRIES = CountryRegistry(os.path.join(BASE_DIR, "countries.json"))
+
+# Rough in-memory size of a loaded sheet or index, for the airport memory
+# budget. Only needs to rank airports against each other, not be exact.
+def approx_nbytes(value):
+    if isinstance(value, MappedPayload):
+        return 0  # Shared page cache, not this process's memory
+    if isinstance(value, pd.DataFrame):
+        if value.attrs.get("mapped"):
+            return 0
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, SheetPayload):
+        # Decoded records take roughly twice their encoded size
+        return 3 * sum(map(len, value.fragments)) + len(value.list_body)
+    if isinstance(value, FacilityIndex):
+        if value.matrix is None:
+            return 0
+        matrix = value.matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes + 100 * len(value.vectorizer.vocabulary_)
+    if isinstance(value, TransportSearchIndex):
+        # Records and fragments are shared with the payloads
+        return 2 * sum(map(len, value.fragments)) + 100 * len(value.postings) + 40 * sum(map(len, value.postings.values()))
+    if isinstance(value, FuzzyMatcher):
+        return 100 * len(value.keys)
+    if isinstance(value, TrainNetwork):
+        return 200 * (sum(map(len, value.stops)) + len(value.names))
+    if isinstance(value, dict):
+        return 100 * len(value)
+    return 0
+
+# One airport's sheets and everything built from them. Nothing is read until
+# first used: a request for Dubai's metro reads that sheet alone, and the
+# TF-IDF index is only built once someone asks about facilities.
+class AirportData:
+    def __init__(self, snapshot, name, layout):
+        self.name = name
+        self.sheets = load_sheets(snapshot, layout)
+        self.payloads = snapshot.payloads(self.sheets, layout)
+        builders = {"visa": lambda: build_visa_eligibility(COUNTRIES, self.sheets)}
+        if "facilities" in self.sheets:
+            builders["facilities"] = lambda: FacilityIndex(self.sheets["facilities"], self.payloads["facilities"])
+        if "transport" in self.sheets:
+            builders["transport"] = lambda: build_transport_index(self.payloads["transport"])
+            builders["transport_options"] = lambda: FuzzyMatcher(self.sheets["transport"].keys(), processor=default_process)
+            builders["train"] = lambda: build_train_network(self.sheets["transport"], self.payloads["transport"])
+        self.indexes = LazyDict({key: DATA_LOAD_SECONDS.timed(step=f"build_{key}")(builder) for key, builder in builders.items()})
+        self._sizes = {}  # Path of a loaded value -> approx_nbytes
+
+    @property
+    def facility_index(self):
+        return self.indexes["facilities"]
 
-USER_STATE = {}
+    @property
+    def transport_index(self):
+        return self.indexes["transport"]
+
+    @property
+    def transport_matcher(self):
+        return self.indexes["transport_options"]
+
+    @property
+    def train_network(self):
+        return self.indexes.get("train")
+
+    @property
+    def visa_eligibility(self):
+        return self.indexes["visa"]
+
+    def _loaded(self, values, path):
+        for key, value in values.loaded().items():
+            if isinstance(value, LazyDict):
+                yield from self._loaded(value, path + (key,))
+            else:
+                yield path + (key,), value
+
+    def nbytes(self):
+        """Approximate memory held by the parts loaded so far."""
+        total = 0
+        for root, values in [("sheets", self.sheets), ("payloads", self.payloads), ("indexes", self.indexes)]:
+            for path, value in self._loaded(values, (root,)):
+                if path not in self._sizes:
+                    self._sizes[path] = approx_nbytes(value)
+                total += self._sizes[path]
+        return total
+
+    def warm(self):
+        """Build every sheet and index of this airport up front."""
+        for payload in self.payloads.values():
+            if isinstance(payload, Mapping):
+                list(payload.values())
+        list(self.indexes.values())
+        return self
+
+# Loaded airports in least recently used order, bounded by an approximate
+# memory budget. An airport is loaded on first use; once the loaded airports
+# together exceed the budget the coldest ones are dropped. A request still
+# holding a dropped airport keeps using it, and the next request for that
+# airport loads it again from the snapshot.
+class AirportCache(Mapping):
+    def __init__(self, snapshot, registry, budget):
+        self.snapshot = snapshot
+        self.registry = registry
+        self.budget = budget
+        self.loads = 0
+        self.evictions = 0
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        layout = self.registry.layout(name)
+        with self._lock:
+            airport = self._resident.get(name)
+            if airport is None:
+                airport = self._resident[name] = AirportData(self.snapshot, name, layout)
+                self.loads += 1
+            self._resident.move_to_end(name)
+            self._evict()
+        return airport
+
+    def _evict(self):
+        # Caller holds the lock; the airport just requested is never dropped
+        total = sum(airport.nbytes() for airport in self._resident.values())
+        while total > self.budget and len(self._resident) > 1:
+            name, airport = self._resident.popitem(last=False)
+            total -= airport.nbytes()
+            self.evictions += 1
+            logging.debug(f"Unloaded airport {name} to stay within the memory budget")
+
+    def __iter__(self):
+        return iter(self.registry.names)
+
+    def __len__(self):
+        return len(self.registry.names)
+
+    def resident(self):
+        """Names of the airports currently loaded, coldest first."""
+        with self._lock:
+            return list(self._resident)
+
+    def nbytes(self):
+        """Approximate memory held by the loaded airports."""
+        with self._lock:
+            return sum(airport.nbytes() for airport in self._resident.values())
+
+# Everything derived from one version of the workbook and manifest: the
+# airport registry, the intent router generated from it and the airports'
+# sheets and indexes. A Dataset is never mutated once published, so swapping
+# the DATASET reference moves every new request onto new data and a request
+# that already holds the old one keeps a consistent view.
+class Dataset:
+    def __init__(self, snapshot, registry):
+        self.snapshot = snapshot
+        self.registry = registry
+        self.version = hashlib.sha256(f"{snapshot.version}:{registry.digest}".encode("utf-8")).hexdigest()[:16]
+        self.loaded_at = datetime.now()
+        self.airports = AirportCache(snapshot, registry, AIRPORT_MEMORY_BUDGET)
+        self.router = IntentRouter(INTENT_TABLE + registry.intents())
+
+    def warm(self, airports=()):
+        """Build every sheet and index of the given airports up front."""
+        for name in airports:
+            if name in self.registry:
+                self.airports[name].warm()
+        return self
+
+@DATA_LOAD_SECONDS.timed(step="dataset")
+def load_dataset():
+    snapshot_class = MappedSnapshot if DATA_MODE == "mapped" else PrivateSnapshot
+    return Dataset(snapshot_class(DATA_FILE, SNAPSHOT_DIR), AirportRegistry(MANIFEST_FILE))
+
+# Modification times of the files a Dataset is built from
+def data_mtimes():
+    return (os.path.getmtime(DATA_FILE), os.path.getmtime(MANIFEST_FILE))
+
+# Load the workbook snapshot and manifest once; airports load on first use
+DATASET = load_dataset()
+DATA_MTIME = data_mtimes()
+RELOAD_LOCK = threading.Lock()
+DATA_WATCH_INTERVAL = float(os.environ.get("AIRPORT_DATA_WATCH_INTERVAL", "5"))
+
+# Build a new Dataset from the workbook and manifest and publish it with a
+# single reference swap. Airports loaded in the current Dataset are warmed
+# first so hot airports stay fast. Runs off the request path; returns True if
+# the version changed.
+def reload_data():
+    global DATASET, DATA_MTIME
+    with RELOAD_LOCK:
+        try:
+            mtime = data_mtimes()
+            dataset = load_dataset()
+            if dataset.version == DATASET.version:
+                DATA_MTIME = mtime
+                return False
+            dataset.warm(DATASET.airports.resident())
+        except Exception as e:
+            logging.error(f"Failed to reload {DATA_FILE} / {MANIFEST_FILE}: {str(e)}")
+            return False
+        DATASET, DATA_MTIME = dataset, mtime
+        logging.debug(f"Swapped in data version {dataset.version}")
+        return True
+
+# Start reload_data in a background thread unless a reload is already running
+def start_reload():
+    if RELOAD_LOCK.locked():
+        return False
+    threading.Thread(target=reload_data, name="data-reload", daemon=True).start()
+    return True
+
+# Poll the workbook's and manifest's mtimes and reload in the background when
+# either changes, until DATA_WATCH_STOP is set
+DATA_WATCH_STOP = threading.Event()
+
+def watch_data_file(interval):
+    while not DATA_WATCH_STOP.is_set():
+        try:
+            if data_mtimes() != DATA_MTIME:
+                reload_data()
+        except OSError as e:
+            logging.error(f"Unable to stat data files: {str(e)}")
+        DATA_WATCH_STOP.wait(interval)
+
+if DATA_WATCH_INTERVAL > 0:
+    threading.Thread(target=watch_data_file, args=(DATA_WATCH_INTERVAL,), name="data-watch", daemon=True).start()
+
+# Fixed-capacity history of the replies sent to one session. Every item gets
+# a sequence number; once the buffer is full the oldest items drop off, so a
+# long conversation holds at most `capacity` replies in memory.
+class ReplyHistory:
+    def __init__(self, capacity):
+        self.items = deque(maxlen=capacity)
+        self.cursor = 0  # Sequence number the next item will get
+
+    def extend(self, replies):
+        """Append replies and return the cursor just past them."""
+        for reply in replies:
+            self.items.append((self.cursor, reply))
+            self.cursor += 1
+        return self.cursor
+
+    def page(self, before=None, limit=20):
+        """Return up to limit replies older than the before cursor, oldest first, and the cursor for the next page."""
+        if before is None:
+            before = self.cursor
+        older = [(seq, reply) for seq, reply in self.items if seq < before]
+        page = older[-limit:] if limit > 0 else []
+        next_before = page[0][0] if page and len(older) > len(page) else None
+        return [reply for _, reply in page], next_before
+
+REPLY_HISTORY_SIZE = int(os.environ.get("REPLY_HISTORY_SIZE", "50"))
 SESSION_TIMEOUT = timedelta(hours=1)  # Define session timeout duration
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "50000"))  # Hard cap, least recently active evicted first
+USER_STATE = SessionStore(SESSION_TIMEOUT, MAX_SESSIONS, factory=lambda: {"previous_replies": ReplyHistory(REPLY_HISTORY_SIZE)})
 
-# Cache for storing the list of valid countries
-VALID_COUNTRIES_CACHE = []
+# The Dataset a request works on, pinned on first use so that every handler
+# it reaches and its X-Data-Version header see the same data even if a
+# reload swaps DATASET mid-request
+def current_dataset():
+    if "dataset" not in g:
+        g.dataset = DATASET
+    return g.dataset
 
 # Utility function to clean up old sessions
 def cleanup_sessions():
-    now = datetime.now()
-    expired_users = [user_id for user_id, state in USER_STATE.items() if state.get("last_active", now) < now - SESSION_TIMEOUT]
-    for user_id in expired_users:
-        del USER_STATE[user_id]
-        logging.debug(f"Cleaned up session for user: {user_id}")
-
-def fetch_valid_countries():
-    global VALID_COUNTRIES_CACHE
-    if not VALID_COUNTRIES_CACHE:
-        try:
-            # Fetch the list of countries from the REST Countries API
-            response = requests.get("https://restcountries.com/v3.1/all")
-            response.raise_for_status()  # Raise an error for HTTP issues
-            countries = response.json()
-            # Extract country names and store them in the cache
-            VALID_COUNTRIES_CACHE = [country["name"]["common"] for country in countries if "name" in country and "common" in country["name"]]
-            logging.debug(f"Fetched {len(VALID_COUNTRIES_CACHE)} countries from the API.")
-        except Exception as e:
-            logging.error(f"Failed to fetch countries from API: {str(e)}")
-            VALID_COUNTRIES_CACHE = []  # Fallback to an empty list
-    return VALID_COUNTRIES_CACHE
+    for user_id in USER_STATE.expire():
+        SESSION_LOG.debug("Cleaned up session for user: %s", user_id)
 
 @app.route("/query", methods=["POST"])
 def query():
     try:
-        logging.debug("Received a request at /query endpoint")
+        QUERY_LOG.debug("Received a request at /query endpoint")
         cleanup_sessions()  # Clean up old sessions
         data = request.get_json()
         user_id = data.get("user_id", "default")
         message = data.get("message", "").lower()
 
-        if user_id not in USER_STATE:
-            USER_STATE[user_id] = {"last_active": datetime.now(), "previous_replies": []}
+        state = USER_STATE.touch(user_id)  # Create or refresh the session
+        dataset = current_dataset()
+        registry = dataset.registry
 
-        state = USER_STATE[user_id]
-        state["last_active"] = datetime.now()  # Update last active time
+        # A cursor continues an earlier listing, whatever the session state now is
+        if data.get("cursor"):
+            try:
+                version, airport, query_type, message, offset = decode_cursor(data["cursor"])
+            except ValueError:
+                return jsonify({"response": "Sorry, I couldn't continue that list. Please search again.", "type": "text"})
+            if version != dataset.version or airport not in registry or query_type not in LIST_HANDLERS:
+                return jsonify({"response": "These results have changed since. Please search again.", "type": "text"})
+            g.paging = Paging.from_request(data, version, (airport, query_type, message), offset)
+            return LIST_HANDLERS[query_type](dataset, airport, message)
+
+        # Find every intent keyword in one pass over the message
+        intents = dataset.router.match(message)
 
         # Handle "bye" to end the session
-        if "bye" in message:
+        if "goodbye" in intents:
             if user_id in USER_STATE:
                 del USER_STATE[user_id]
-                logging.debug(f"Ended session for user: {user_id}")
+                SESSION_LOG.debug("Ended session for user: %s", user_id)
             return jsonify({"response": "Goodbye! Have a great day!", "type": "text"})
 
         # Handle "thanks" or "thank you"
-        if "thanks" in message or "thank you" in message:
+        if "thanks" in intents:
             return jsonify({"response": "You're welcome! Would you like any more assistance?", "type": "text"})
 
         # Handle "no" after an error or assistance prompt
-        if "no" in message:
+        if "decline" in intents:
             if user_id in USER_STATE:
                 del USER_STATE[user_id]
-                logging.debug(f"Ended session for user: {user_id}")
+                SESSION_LOG.debug("Ended session for user: %s", user_id)
             return jsonify({"response": "Goodbye! Have a great day!", "type": "text"})
 
         # Airport selection
-        if "bangalore" in message:
-            state["airport"] = "Bangalore"
-            return jsonify({"response": "You selected Bangalore Airport. Choose an option:", "buttons": ["Transport", "Facilities", "Visa"]})
-        elif "dubai" in message:
-            state["airport"] = "Dubai"
-            return jsonify({"response": "You selected Dubai Airport. Choose an option:", "buttons": ["Transport", "Facilities", "Visa"]})
+        if "airport" in intents:
+            state["airport"] = intents["airport"]
+            return jsonify({"response": f"You selected {state['airport']} Airport. Choose an option:", "buttons": registry.categories(state["airport"])})
 
-        # Ensure an airport is selected before proceeding
-        if "airport" not in state:
-            return jsonify({"response": "Please select an airport first:", "buttons": ["Bangalore", "Dubai"]})
+        # Ensure an airport is selected before proceeding (it may have left the manifest since)
+        if state.get("airport") not in registry:
+            state.pop("airport", None)
+            return jsonify({"response": "Please select an airport first:", "buttons": registry.names})
 
         # Category selection
-        if "transport" in message:
+        category = intents.get("category")
+        if category == "transport":
             state["query"] = "transport"
-            transport_options = list(SHEETS[state["airport"]]["transport"].keys())
+            transport_options = registry.transport_options(state["airport"])
             return jsonify({
                 "response": f"What transportation option are you looking for at {state['airport']} Airport?", 
                 "buttons": transport_options
             })
-        elif "facilities" in message:
+        elif category == "facilities":
             state["query"] = "facilities"
             return jsonify({"response": "What facilities are you looking for? (e.g., lounge, spa, shops, restaurants)"})
-        elif "visa" in message:
+        elif category == "visa":
             state["query"] = "visa"
             return jsonify({"response": "Please enter your country name."})
 
@@ -147,166 +727,115 @@ def query():
         if "airport" in state and "query" in state:
             airport = state["airport"]
             query_type = state["query"]
+            g.paging = Paging.from_request(data, dataset.version, (airport, query_type, message))
 
             if query_type == "transport":
-                return handle_transport(airport, message)
+                return handle_transport(dataset, airport, message)
             elif query_type == "facilities":
-                return handle_facilities(airport, message)
+                return handle_facilities(dataset, airport, message)
             elif query_type == "visa":
-                return handle_visa(airport, message)
+                return handle_visa(dataset, airport, message)
 
         # Default response if no state is matched
-        response = jsonify({"response": "Which airport do you need assistance with? Bangalore or Dubai?", "buttons": ["Bangalore", "Dubai"]})
-        logging.debug(f"Sending response: {response.get_json()}")
-        return response
+        return jsonify({"response": f"Which airport do you need assistance with? {' or '.join(registry.names)}?", "buttons": registry.names})
 
     except Exception as e:
-        logging.error(f"Error: {str(e)}")
+        QUERY_LOG.error("Error: %s", e)
         return jsonify({
             "response": "An error occurred while processing your request. Would you like assistance with something else?",
             "buttons": ["Yes", "No"],
             "type": "text"
         })
 
-# Handlers
-# Helper function to convert time objects to strings
-def convert_time(value):
-    if isinstance(value, datetime.time):
-        return value.strftime("%H:%M:%S")
-    return value
-
-def handle_transport(airport, message):
+# Handlers, each timed by the branch it ends up taking
+@HANDLER_SECONDS.timed(handler="transport", branch="other")
+def handle_transport(dataset, airport, message):
     try:
-        city_data = SHEETS[airport]["transport"]
+        data = dataset.airports[airport]
+        city_data = data.sheets["transport"]
         message = message.lower()  # Convert message to lowercase for case-insensitive matching
-        logging.debug(f"Processing transport query: '{message}' for {airport}")
+        TRANSPORT_LOG.debug("Processing transport query: '%s' for %s", message, airport)
         
         # Special handling for train - including when user has selected from/to locations
         if "train" in message or message.startswith("from:"):
+            network = data.train_network
+
             # Handle the case when user has selected locations from dropdown
             if message.startswith("from:"):
+                set_labels(branch="train_route")
                 try:
                     # Parse the from and to locations from the message
-                    logging.debug(f"Parsing train route: {message}")
+                    TRANSPORT_LOG.debug("Parsing train route: %s", message)
                     parts = message.split("to:")
                     from_location = parts[0].replace("from:", "").strip()
                     to_location = parts[1].strip()
-                    logging.debug(f"Parsed locations - From: '{from_location}', To: '{to_location}'")
-                    
-                    # Find the train key
-                    key = next((k for k in city_data.keys() if "train" in k.lower()), None)
-                    if not key:
-                        logging.debug("No train key found in city_data")
+                    TRANSPORT_LOG.debug("Parsed locations - From: '%s', To: '%s'", from_location, to_location)
+
+                    if network is None:
+                        TRANSPORT_LOG.debug("No train network found for this airport")
                         return jsonify({"response": "Train information is not available for this airport.", "type": "text"})
-                    
-                    train_data = city_data[key]
-                    logging.debug(f"Train data columns: {train_data.columns.tolist()}")
-                    
-                    if "Departure" not in train_data.columns or "Arrival" not in train_data.columns:
-                        # Handle different column names if needed
-                        logging.debug("Column names don't match expected format.")
-                        departure_col = next((col for col in train_data.columns if "depart" in col.lower()), train_data.columns[0])
-                        arrival_col = next((col for col in train_data.columns if "arriv" in col.lower() or "dest" in col.lower()), train_data.columns[1])
-                        logging.debug(f"Using columns: {departure_col} and {arrival_col}")
-                        
-                        # Filter results using the identified columns
-                        filtered_data = train_data[
-                            (train_data[departure_col].astype(str).str.contains(from_location, case=False, na=False)) &
-                            (train_data[arrival_col].astype(str).str.contains(to_location, case=False, na=False))
-                        ]
-                    else:
-                        # Use standard column names
-                        filtered_data = train_data[
-                            (train_data["Departure"].astype(str).str.contains(from_location, case=False, na=False)) &
-                            (train_data["Arrival"].astype(str).str.contains(to_location, case=False, na=False))
-                        ]
-                    
-                    logging.debug(f"Filtered data count: {len(filtered_data)}")
-                    
-                    if not filtered_data.empty:
-                        results = [
-                            {key: (value.strftime('%H:%M:%S') if isinstance(value, time) else value)  # Convert time objects to strings
-                             for key, value in row.items() if pd.notna(value)}
-                            for row in filtered_data.to_dict(orient="records")
-                        ]
+
+                    from_stations = network.resolve(from_location)
+                    to_stations = network.resolve(to_location)
+
+                    # Trains calling at both stations in order
+                    train_ids = network.direct_trains(from_stations, to_stations)
+                    TRANSPORT_LOG.debug("Direct train count: %d", len(train_ids))
+                    if train_ids:
+                        positions, extra = page(len(train_ids))
+                        return list_response((network.fragments[train_ids[i]] for i in positions), **extra)
+
+                    # Otherwise look for journeys with one change at an intermediate station
+                    journeys = network.connections(from_stations, to_stations)
+                    TRANSPORT_LOG.debug("Connecting journey count: %d", len(journeys))
+                    if journeys:
+                        results = [network.describe_connection(journey, from_stations, to_stations) for journey in journeys]
                         return jsonify({"response": results, "type": "list"})
-                    else:
-                        return jsonify({"response": f"No trains found from {from_location} to {to_location}.", "type": "text"})
+
+                    return jsonify({"response": f"No trains found from {from_location} to {to_location}.", "type": "text"})
                 except Exception as e:
-                    logging.error(f"Error processing train location selection: {str(e)}")
-                    logging.error(f"Error traceback: {traceback.format_exc()}")
+                    TRANSPORT_LOG.error("Error processing train location selection: %s", e, exc_info=True)
                     return jsonify({"response": f"Error processing your train route selection: {str(e)}", "type": "text"})
-            
+
             # Original code for initial train selection
-            key = next((k for k in city_data.keys() if "train" in k.lower()), None)
-            if key:
-                if not city_data[key].empty:
-                    # Extract unique options for dropdowns, splitting by commas
-                    train_data = city_data[key]
-                    
-                    # Check for expected columns
-                    departure_col = "Departure" if "Departure" in train_data.columns else next((col for col in train_data.columns if "depart" in col.lower()), train_data.columns[0])
-                    arrival_col = "Arrival" if "Arrival" in train_data.columns else next((col for col in train_data.columns if "arriv" in col.lower() or "dest" in col.lower()), train_data.columns[1])
-                    halt_col = "Halt" if "Halt" in train_data.columns else next((col for col in train_data.columns if "halt" in col.lower() or "stop" in col.lower()), None)
-                    
-                    columns_to_use = [col for col in [departure_col, arrival_col, halt_col] if col is not None]
-                    logging.debug(f"Using columns for location extraction: {columns_to_use}")
-                    
-                    # Extract locations from the identified columns
-                    locations = pd.concat([train_data[col] for col in columns_to_use]).dropna()
-                    if not locations.empty:
-                        if locations.str.contains(',').any():
-                            locations = locations.str.split(',').explode()
-                        locations = locations.str.strip().str.title().unique().tolist()
-                    else:
-                        locations = []
-                    
-                    # Remove "no stops" and sort the list
-                    unique_locations = [loc for loc in locations if loc.lower() not in ["no stops", "none", "na", "n/a"]]
-                    unique_locations.sort()
-                    
-                    logging.debug(f"Found {len(unique_locations)} unique locations")
-                    
-                    return jsonify({
-                        "response": "Please select a 'From' and 'To' location.",
-                        "from_options": unique_locations,
-                        "to_options": unique_locations,
-                        "type": "dropdown"
-                    })
-                else:
-                    return jsonify({"response": f"No data available for {key}.", "type": "text"})
-            else:
+            set_labels(branch="train_dropdown")
+            if network is None:
                 return jsonify({"response": "No transport data found for 'train'.", "type": "text"})
-        
+            if network.empty:
+                return jsonify({"response": "No data available for train.", "type": "text"})
+
+            TRANSPORT_LOG.debug("Found %d unique locations", len(network.stations))
+            return jsonify({
+                "response": "Please select a 'From' and 'To' location.",
+                "from_options": network.stations,
+                "to_options": network.stations,
+                "type": "dropdown"
+            })
+
         # Rest of the original function for other transport options remains the same
         # First check for specific transport options using fuzzy matching
-        best_match, score = process.extractOne(message, city_data.keys(), scorer=fuzz.partial_ratio)
-        if score > 70:  # Use a threshold to determine a good match
-            df = city_data[best_match]
-            if not df.empty:
-                # Exclude fields with missing data
-                filtered_data = [
-                    {key: value for key, value in row.items() if pd.notna(value)}
-                    for row in df.to_dict(orient="records")
-                ]
-                return jsonify({"response": filtered_data, "type": "list"})
+        set_labels(branch="fuzzy_match")
+        match = data.transport_matcher.extract_one(message, threshold=70)
+        if match:  # Scored above the threshold
+            best_match = match[0]
+            payload = data.payloads["transport"][best_match]
+            if payload.records:
+                positions, extra = page(len(payload.fragments))
+                paging = g.get("paging")
+                # A sheet that fits in one page is served from its cached, pre-encoded body
+                if not extra and not (paging and paging.stream):
+                    return app.response_class(payload.list_body, mimetype="application/json")
+                return list_response((payload.fragments[i] for i in positions), **extra)
             else:
                 return jsonify({"response": f"No {best_match} data found for {airport}.", "type": "text"})
 
-        # If no exact match, search inside all sheets using fuzzy matching
-        found_data = []
-        for key, df in city_data.items():
-            try:
-                if df.apply(lambda row: row.astype(str).str.contains(message, case=False, na=False).any(), axis=1).any():
-                    filtered_rows = df[df.apply(lambda row: row.astype(str).str.contains(message, case=False, na=False).any(), axis=1)]
-                    found_data.extend([
-                        {key: value for key, value in row.items() if pd.notna(value)}
-                        for row in filtered_rows.to_dict(orient="records")
-                    ])
-            except Exception as e:
-                logging.error(f"Error searching in {key}: {str(e)}")
-        if found_data:
-            return jsonify({"response": found_data, "type": "list"})
+        # If no exact match, search inside all sheets using the inverted index
+        set_labels(branch="full_text")
+        index = data.transport_index
+        row_ids = index.search(message)
+        if row_ids:
+            positions, extra = page(len(row_ids))
+            return list_response((index.fragments[row_ids[i]] for i in positions), **extra)
 
         # If still no results, suggest available options
         options = list(city_data.keys())
@@ -317,104 +846,287 @@ def handle_transport(airport, message):
         })
 
     except Exception as e:
-        logging.error(f"Error in handle_transport for query '{message}' at {airport} Airport: {str(e)}")
+        TRANSPORT_LOG.error("Error in handle_transport for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": "An error occurred while processing your request. Please try again later.", "type": "text"})
 
-def handle_facilities(airport, message):
+@HANDLER_SECONDS.timed(handler="facilities", branch="other")
+def handle_facilities(dataset, airport, message):
     try:
-        df = SHEETS[airport]["facilities"]
+        index = dataset.airports[airport].facility_index
         message = message.lower()
 
-        # Combine relevant columns into a single text field for TF-IDF
-        if "Type" in df.columns and "Name" in df.columns and "Description" in df.columns:
-            df["combined_text"] = df["Type"].fillna('') + " " + df["Name"].fillna('') + " " + df["Description"].fillna('')
-        else:
+        if not index.formatted:
             return jsonify({"response": "Facilities data is not properly formatted.", "type": "text"})
 
-        # Initialize TF-IDF Vectorizer
-        vectorizer = TfidfVectorizer(stop_words="english")
-        tfidf_matrix = vectorizer.fit_transform(df["combined_text"].fillna(''))
-
-        # Transform the user query
-        query_vector = vectorizer.transform([message])
-
-        # Compute cosine similarity between the query and facilities data
-        from sklearn.metrics.pairwise import cosine_similarity
-        similarity_scores = cosine_similarity(query_vector, tfidf_matrix).flatten()
-
-        # Log similarity scores for debugging
-        logging.debug(f"TF-IDF similarity scores: {similarity_scores}")
-
-        # Get the top matches
-        top_indices = similarity_scores.argsort()[-5:][::-1]  # Top 5 matches
-        top_matches = df.iloc[top_indices]
+        # Rank facilities against the query using the prebuilt TF-IDF index
+        set_labels(branch="tfidf")
+        top_matches = index.search(message, k=5)
+        FACILITIES_LOG.debug("TF-IDF top scores: %s", tuple(score for _, score in top_matches))
 
         # Fallback: Filter by Type if TF-IDF results are not relevant
-        if top_matches.empty or all(similarity_scores[top_indices] == 0):
-            logging.debug("TF-IDF results are empty or irrelevant. Falling back to Type filtering.")
+        if not top_matches or all(score == 0 for _, score in top_matches):
+            FACILITIES_LOG.debug("TF-IDF results are empty or irrelevant. Falling back to Type filtering.")
+            set_labels(branch="type_filter")
             if "lounge" in message:
-                df = df[df["Type"].str.contains("lounge", case=False, na=False)]
+                row_ids = index.filter_by_type("lounge")
             elif "restaurant" in message:
-                df = df[df["Type"].str.contains("restaurant", case=False, na=False)]
-            top_matches = df.head(5)  # Return the first 5 matches after filtering
-
-        if not top_matches.empty:
-            # Exclude fields with missing data and handle time objects
-            filtered_data = []
-            for row in top_matches.to_dict(orient="records"):
-                cleaned_row = {}
-                for key, value in row.items():
-                    if pd.notna(value):
-                        if isinstance(value, time):
-                            cleaned_row[key] = value.strftime('%H:%M:%S')
-                        else:
-                            cleaned_row[key] = value
-                filtered_data.append(cleaned_row)
+                row_ids = index.filter_by_type("restaurant")
+            else:
+                row_ids = list(range(min(5, len(index.rows))))  # Return the first 5 rows
+        else:
+            row_ids = [row_id for row_id, _ in top_matches]
+
+        positions, extra = page(len(row_ids))
+        row_ids = [row_ids[i] for i in positions]
+        if row_ids:
+            filtered_data = [index.rows[row_id] for row_id in row_ids]
 
             # Save the response to previous replies
             user_id = request.get_json().get("user_id", "default")
+            history_cursor = None
             if user_id in USER_STATE:
-                USER_STATE[user_id]["previous_replies"].extend(filtered_data)
+                history_cursor = USER_STATE[user_id]["previous_replies"].extend(filtered_data)
 
-            # Include previous replies in the response
-            return jsonify({
-                "response": filtered_data,
-                "type": "list",
-                "previous_replies": USER_STATE[user_id]["previous_replies"]
-            })
+            # Only the new replies are sent; older ones are paged through /history
+            return list_response([index.fragments[row_id] for row_id in row_ids], history_cursor=history_cursor, **extra)
 
         return jsonify({"response": f"No facilities found matching '{message}' at {airport} Airport.", "type": "text"})
 
     except Exception as e:
-        logging.error(f"Error in handle_facilities for query '{message}' at {airport} Airport: {str(e)}")
+        FACILITIES_LOG.error("Error in handle_facilities for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": f"An error occurred while searching for facilities: {str(e)}", "type": "text"})
 
-def handle_visa(airport, message):
+# Handlers whose listings can be continued with a cursor
+LIST_HANDLERS = {"transport": handle_transport, "facilities": handle_facilities}
+
+@HANDLER_SECONDS.timed(handler="visa", branch="lookup")
+def handle_visa(dataset, airport, message):
     try:
-        # Fetch the list of valid countries
-        valid_countries = fetch_valid_countries()
-        if not valid_countries:
-            return jsonify({"response": "Unable to validate country names at the moment. Please try again later.", "type": "text"})
-
-        # Validate if the input is a valid country
-        country = message.strip().title()  # Normalize input
-        if country not in valid_countries:
+        # Validate the input against the bundled country registry
+        country = COUNTRIES.resolve(message)
+        if country is None:
+            set_labels(branch="unrecognized")
             return jsonify({"response": f"'{message}' is not recognized as a valid country. Please enter a valid country name.", "type": "text"})
 
         # Proceed with visa logic if the input is valid
-        df = SHEETS[airport]["visa"]
-        if not df[df.iloc[:, 1].str.contains(country, case=False, na=False)].empty:
+        eligibility = dataset.airports[airport].visa_eligibility.get(country, NOT_ELIGIBLE)
+        if eligibility == VISA_ON_ARRIVAL:
             return jsonify({"response": "Hooray! Your passport is granted visa on arrival.", "type": "text"})
-        elif airport == "Dubai":
-            gcc_df = SHEETS[airport]["GCC"]
-            if not gcc_df[gcc_df.iloc[:, 1].str.contains(country, case=False, na=False)].empty:
-                return jsonify({"response": "As your country belongs to the GCC, you do not require a visa to enter.", "type": "text"})
+        elif eligibility == GCC_EXEMPT:
+            return jsonify({"response": "As your country belongs to the GCC, you do not require a visa to enter.", "type": "text"})
         return jsonify({"response": "Unfortunately, your country does not have visa on arrival at this airport.", "type": "text"})
     except Exception as e:
-        logging.error(f"Error in handle_visa for query '{message}' at {airport} Airport: {str(e)}")
+        QUERY_LOG.error("Error in handle_visa for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": f"An error occurred while checking visa information: {str(e)}", "type": "text"})
 
+# Page backwards through a session's earlier replies, starting just before
+# the `before` cursor (the latest reply when omitted)
+@app.route("/history", methods=["GET"])
+def reply_history():
+    user_id = request.args.get("user_id", "default")
+    before = request.args.get("before", type=int)
+    limit = min(request.args.get("limit", 20, type=int), REPLY_HISTORY_SIZE)
+    if user_id not in USER_STATE:
+        return jsonify({"items": [], "next_before": None})
+    items, next_before = USER_STATE[user_id]["previous_replies"].page(before, limit)
+    return jsonify({"items": items, "next_before": next_before})
+
+# VISA ELIGIBILITY ROUTES
+MAX_ELIGIBILITY_COUNTRIES = 1000
+
+# Bulk lookup for whole passenger manifests: every requested country against
+# every requested airport (all airports when none are given) in one call
+@app.route("/visa/eligibility", methods=["POST"])
+def visa_eligibility():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        countries = data.get("countries")
+        if not isinstance(countries, list) or not countries:
+            return jsonify({"error": "Missing countries"}), 400
+        if len(countries) > MAX_ELIGIBILITY_COUNTRIES:
+            return jsonify({"error": f"At most {MAX_ELIGIBILITY_COUNTRIES} countries per request"}), 400
+
+        requested = data.get("airports")
+        if requested is not None and not (
+                isinstance(requested, list) and all(isinstance(name, str) for name in requested)):
+            return jsonify({"error": "Airports must be a list of airport names"}), 400
+
+        dataset = current_dataset()
+        airports_by_name = {airport.lower(): airport for airport in dataset.registry.names}
+        requested = requested or dataset.registry.names
+        unknown = [name for name in requested if name.lower() not in airports_by_name]
+        if unknown:
+            return jsonify({"error": f"Unknown airports: {', '.join(unknown)}"}), 400
+        airports = [airports_by_name[name.lower()] for name in requested]
+        tables = {airport: dataset.airports[airport].visa_eligibility for airport in airports}
+
+        results = []
+        for value in countries:
+            country = COUNTRIES.resolve(value)
+            if country is None:
+                results.append({"input": value, "country": None, "error": "Unrecognized country"})
+                continue
+            results.append({
+                "input": value,
+                "country": country,
+                "eligibility": {airport: table.get(country, NOT_ELIGIBLE) for airport, table in tables.items()}
+            })
+        return jsonify({"version": dataset.version, "results": results})
+    except Exception as e:
+        logging.error(f"Error in visa eligibility lookup: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# DATA ADMINISTRATION ROUTES
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+@app.after_request
+def add_data_version(response):
+    response.headers["X-Data-Version"] = current_dataset().version
+    return response
+
+@app.route("/data/version", methods=["GET"])
+def data_version():
+    dataset = current_dataset()
+    return jsonify({"version": dataset.version, "loaded_at": dataset.loaded_at.isoformat()})
+
+# Rebuilding a Dataset is expensive, so the route is off unless ADMIN_TOKEN is set
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Reload endpoint disabled; set ADMIN_TOKEN to enable it"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+    started = start_reload()
+    return jsonify({"status": "reloading" if started else "reload already in progress", "version": current_dataset().version}), 202
+
+# READ-ONLY DATA API
+# Answers that depend only on the data version and the URL, never on the
+# session: the airports, their transport options and sheets, the train
+# station dropdown and the facility types. They are served over GET with the
+# data version as ETag, so browsers and CDNs can keep them for
+# DATA_CACHE_MAX_AGE seconds and then revalidate them with a 304 until the
+# next reload changes the version. Routes resolve their resource and answer
+# 404 before calling cached_data(), so a missing resource is never revalidated
+# or marked cacheable.
+DATA_CACHE_MAX_AGE = int(os.environ.get("DATA_CACHE_MAX_AGE", "300"))
+
+def cached_data(dataset, build):
+    """Reply with build(), or 304 without calling it when the client already holds this data version."""
+    # If-None-Match uses the weak comparison, so copies a proxy recompressed still match
+    if request.if_none_match.contains_weak(dataset.version):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build())
+    response.set_etag(dataset.version)
+    response.headers["Cache-Control"] = f"public, max-age={DATA_CACHE_MAX_AGE}"
+    return response
+
+def find_airport(dataset, airport):
+    """The registry's name for airport, matched case-insensitively, or None."""
+    airports_by_name = {name.lower(): name for name in dataset.registry.names}
+    return airports_by_name.get(airport.strip().lower())
+
+def unknown_airport(airport):
+    return jsonify({"error": f"Unknown airport: {airport}"}), 404
+
+@app.route("/data/airports", methods=["GET"])
+def data_airports():
+    dataset = current_dataset()
+    registry = dataset.registry
+    return cached_data(dataset, lambda: jsonify({
+        "version": dataset.version,
+        "airports": [{"name": name, "categories": registry.categories(name)} for name in registry.names]
+    }))
+
+@app.route("/data/airports/<airport>/transport", methods=["GET"])
+def data_transport_options(airport):
+    dataset = current_dataset()
+    name = find_airport(dataset, airport)
+    if name is None:
+        return unknown_airport(airport)
+    if "transport" not in dataset.registry.layout(name):
+        return jsonify({"error": f"No transport data for {name}"}), 404
+    return cached_data(dataset, lambda: jsonify({
+        "response": f"What transportation option are you looking for at {name} Airport?",
+        "buttons": dataset.registry.transport_options(name)
+    }))
+
+# A whole transport sheet, in the same shape as the /query listing
+@app.route("/data/airports/<airport>/transport/<option>", methods=["GET"])
+def data_transport_sheet(airport, option):
+    dataset = current_dataset()
+    name = find_airport(dataset, airport)
+    if name is None:
+        return unknown_airport(airport)
+    options = {key.lower(): key for key in dataset.registry.transport_options(name)}
+    sheet = options.get(option.strip().lower())
+    if sheet is None:
+        return jsonify({"error": f"Unknown transport option: {option}"}), 404
+
+    def build():
+        payload = dataset.airports[name].payloads["transport"][sheet]
+        if not payload.records:
+            return jsonify({"response": f"No {sheet} data found for {name}.", "type": "text"})
+        return app.response_class(payload.list_body, mimetype="application/json")
+    return cached_data(dataset, build)
+
+@app.route("/data/airports/<airport>/trains/stations", methods=["GET"])
+def data_train_stations(airport):
+    dataset = current_dataset()
+    name = find_airport(dataset, airport)
+    if name is None:
+        return unknown_airport(airport)
+    network = dataset.airports[name].train_network
+    if network is None or network.empty:
+        return jsonify({"error": f"No train data for {name}"}), 404
+
+    def build():
+        return jsonify({
+            "response": "Please select a 'From' and 'To' location.",
+            "from_options": network.stations,
+            "to_options": network.stations,
+            "type": "dropdown"
+        })
+    return cached_data(dataset, build)
+
+@app.route("/data/airports/<airport>/facilities/types", methods=["GET"])
+def data_facility_types(airport):
+    dataset = current_dataset()
+    name = find_airport(dataset, airport)
+    if name is None:
+        return unknown_airport(airport)
+    if "facilities" not in dataset.registry.layout(name):
+        return jsonify({"error": f"No facilities data for {name}"}), 404
+
+    def build():
+        df = dataset.airports[name].sheets["facilities"]
+        types = df["Type"].dropna().astype(str).str.strip() if "Type" in df.columns else pd.Series(dtype=str)
+        return jsonify({
+            "response": "What facilities are you looking for?",
+            "buttons": [value for value in types.unique().tolist() if value]
+        })
+    return cached_data(dataset, build)
+
 # FLIGHT DELAY PREDICTION ROUTES
+# Shared, pooled Amadeus client with a server-side token cache
+AMADEUS = AmadeusClient(
+    connect_timeout=float(os.environ.get("AMADEUS_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.environ.get("AMADEUS_READ_TIMEOUT", "10"))
+)
+
+# Airport autocomplete results by (endpoint, normalised keyword). The answer
+# for a keyword rarely changes, so keystrokes from every user share one cache
+# and concurrent identical lookups make a single upstream call.
+AIRPORT_SEARCH_CACHE = TTLCache(
+    ttl=float(os.environ.get("AIRPORT_SEARCH_TTL", "3600")),
+    max_entries=int(os.environ.get("AIRPORT_SEARCH_CACHE_SIZE", "5000"))
+)
+
+def airport_search_key(api_endpoint, query):
+    return (api_endpoint.rstrip("/"), " ".join(query.split()).casefold())
+
 @app.route("/amadeus/token", methods=["POST"])
 def get_amadeus_token():
     try:
@@ -426,20 +1138,9 @@ def get_amadeus_token():
         if not all([client_id, client_secret, api_endpoint]):
             return jsonify({"error": "Missing credentials"}), 400
             
-        response = requests.post(
-            f"{api_endpoint}/v1/security/oauth2/token",
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-            data={
-                "grant_type": "client_credentials",
-                "client_id": client_id,
-                "client_secret": client_secret
-            }
-        )
-        
-        if not response.ok:
-            return jsonify({"error": f"Amadeus API error: {response.status_code}"}), response.status_code
-            
-        return jsonify(response.json())
+        return jsonify(AMADEUS.get_token(api_endpoint, client_id, client_secret))
+    except AmadeusError as e:
+        return jsonify({"error": str(e)}), e.status_code
     except Exception as e:
         logging.error(f"Error getting Amadeus token: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -454,19 +1155,349 @@ def search_airport():
         if not all([query, token, api_endpoint]):
             return jsonify({"error": "Missing parameters"}), 400
             
-        response = requests.get(
-            f"{api_endpoint}/v1/reference-data/locations?subType=AIRPORT&keyword={query}",
-            headers={"Authorization": token}
-        )
-        
-        if not response.ok:
-            return jsonify({"error": f"Amadeus API error: {response.status_code}"}), response.status_code
-            
-        return jsonify(response.json())
+        key = airport_search_key(api_endpoint, query)
+        keyword = key[1]
+        load = lambda: AMADEUS.search_airports(api_endpoint, token, keyword).content
+        # The key ignores the token, so only callers with a checked token read
+        # the shared entry; lookups with any other token are coalesced per
+        # token and go to Amadeus, which checks it
+        shared = AMADEUS.trusts(token)
+        # Cache and pass the upstream JSON through without decoding and re-encoding it
+        body = AIRPORT_SEARCH_CACHE.get_or_load(key if shared else key + (authorization_digest(token),), load)
+        if not shared:
+            AIRPORT_SEARCH_CACHE.set(key, body)
+        return app.response_class(body, mimetype="application/json")
+    except AmadeusError as e:
+        return jsonify({"error": str(e)}), e.status_code
     except Exception as e:
         logging.error(f"Error searching airports: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Delay predictions by (endpoint, flight parameters). Predictions are not
+# user specific, so every search shares them; the same flight shows up in many
+# itineraries of one result page and across searches for the same route.
+FLIGHT_DELAY_CACHE = TTLCache(
+    ttl=float(os.environ.get("FLIGHT_DELAY_TTL", "21600")),
+    max_entries=int(os.environ.get("FLIGHT_DELAY_CACHE_SIZE", "20000"))
+)
+
+# Every upstream prediction call, from any request, draws from one token
+# bucket so concurrent batches together stay under the Amadeus rate limit
+FLIGHT_DELAY_LIMITER = TokenBucket(
+    rate=float(os.environ.get("AMADEUS_RATE_LIMIT", "10")),
+    capacity=float(os.environ.get("AMADEUS_RATE_BURST", "10"))
+)
+FLIGHT_DELAY_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FLIGHT_DELAY_WORKERS", "8")),
+    thread_name_prefix="flight-delay"
+)
+MAX_DELAY_SEGMENTS = 200
+NO_TRAINING_DATA = "Data not seen at training time"
+
+def flight_delay_params(segment):
+    """Build prediction query parameters from a flight-offer segment."""
+    departure = datetime.fromisoformat(segment["departure"]["at"])
+    arrival_at = segment.get("arrival", {}).get("at")
+    # Without an arrival time fall back to the same 3 hour guess the page used
+    arrival = datetime.fromisoformat(arrival_at) if arrival_at else departure + timedelta(hours=3)
+    return {
+        "originLocationCode": segment["departure"]["iataCode"].upper(),
+        "destinationLocationCode": segment["arrival"]["iataCode"].upper(),
+        "departureDate": departure.strftime("%Y-%m-%d"),
+        "departureTime": departure.strftime("%H:%M:%S"),
+        "arrivalDate": arrival.strftime("%Y-%m-%d"),
+        "arrivalTime": arrival.strftime("%H:%M:%S"),
+        "aircraftCode": str((segment.get("aircraft") or {}).get("code") or "320"),
+        "carrierCode": segment["carrierCode"].upper(),
+        "flightNumber": str(segment["number"]),
+        "duration": segment.get("duration") or "PT3H"
+    }
+
+def group_delay_segments(api_endpoint, segments):
+    """Group identical segments: cache key -> (params, positions in the request)."""
+    endpoint = api_endpoint.rstrip("/")
+    groups = {}
+    for i, segment in enumerate(segments):
+        try:
+            params = flight_delay_params(segment)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f"Invalid segment at index {i}")
+        key = (endpoint, tuple(sorted(params.items())))
+        groups.setdefault(key, (params, []))[1].append(i)
+    return groups
+
+def first_prediction(payload):
+    data = payload.get("data") or []
+    if not data:
+        return {"predictionUnavailable": True, "error": "No prediction returned for this flight."}
+    return data[0]
+
+def untrained_prediction(error):
+    """The model has nothing for this flight; that answer is worth caching too."""
+    if error.detail and NO_TRAINING_DATA in error.detail:
+        return {"predictionUnavailable": True, "error": "No historical data available for this flight."}
+    return None
+
+def failed_prediction(error):
+    if isinstance(error, AmadeusError):
+        return {"predictionUnavailable": True, "error": error.detail or str(error)}
+    logging.error(f"Error fetching delay prediction: {str(error)}")
+    return {"predictionUnavailable": True, "error": str(error)}
+
+def fetch_flight_delay(api_endpoint, authorization, params):
+    FLIGHT_DELAY_LIMITER.acquire()
+    try:
+        response = AMADEUS.predict_flight_delay(api_endpoint, authorization, params)
+    except AmadeusError as e:
+        prediction = untrained_prediction(e)
+        if prediction is None:
+            raise
+        return prediction
+    return first_prediction(response.json())
+
+def delay_line(indexes, prediction):
+    return dumps({"indexes": indexes, "prediction": prediction}) + b"\n"
+
+@app.route("/amadeus/flight-delay/batch", methods=["POST"])
+def predict_flight_delays():
+    """
+    Predict delays for all segments of a search in one request. Identical
+    segments are looked up once, cached predictions are sent straight away and
+    the rest are fetched concurrently. The response is NDJSON with one
+    {"indexes": [...], "prediction": {...}} line per distinct segment, written
+    as soon as its prediction is ready; indexes point into the posted list.
+    """
+    data = request.get_json(silent=True) or {}
+    token = request.headers.get("Authorization")
+    api_endpoint = data.get("api_endpoint")
+    segments = data.get("segments")
+
+    if not token or not api_endpoint or not isinstance(segments, list):
+        return jsonify({"error": "Missing parameters"}), 400
+    if len(segments) > MAX_DELAY_SEGMENTS:
+        return jsonify({"error": f"At most {MAX_DELAY_SEGMENTS} segments per request"}), 400
+
+    try:
+        groups = group_delay_segments(api_endpoint, segments)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Shared predictions are only read with a checked token; others are
+    # cached per token until Amadeus has accepted it
+    scope = () if AMADEUS.trusts(token) else (authorization_digest(token),)
+    ready = []
+    futures = {}
+    for key, (params, indexes) in groups.items():
+        key += scope
+        prediction = FLIGHT_DELAY_CACHE.get(key)
+        if prediction is not None:
+            ready.append((indexes, prediction))
+            continue
+        # Submit before streaming starts so upstream calls run while cached lines go out
+        loader = partial(fetch_flight_delay, api_endpoint, token, params)
+        futures[FLIGHT_DELAY_EXECUTOR.submit(FLIGHT_DELAY_CACHE.get_or_load, key, loader)] = indexes
+    logging.debug("Flight delay batch: %d segments, %d distinct, %d cached", len(segments), len(groups), len(ready))
+
+    def generate():
+        for indexes, prediction in ready:
+            yield delay_line(indexes, prediction)
+        for future in as_completed(futures):
+            try:
+                prediction = future.result()
+            except Exception as e:
+                prediction = failed_prediction(e)
+            yield delay_line(futures[future], prediction)
+
+    return app.response_class(generate(), mimetype="application/x-ndjson")
+
+MAX_RISK_ITINERARIES = 1000
+
+# Rank a whole result list by missed-connection risk in one call, so pages and
+# agents can sort or filter hundreds of itineraries without scoring each card
+@app.route("/itineraries/risk", methods=["POST"])
+def itinerary_risk():
+    try:
+        data = request.get_json(silent=True) or {}
+        itineraries = data.get("itineraries")
+        if not isinstance(itineraries, list) or not itineraries:
+            return jsonify({"error": "Missing itineraries"}), 400
+        if len(itineraries) > MAX_RISK_ITINERARIES:
+            return jsonify({"error": f"At most {MAX_RISK_ITINERARIES} itineraries per request"}), 400
+        return jsonify({"results": score_itineraries(itineraries)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error scoring itineraries: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# WEATHER ROUTES
+WEATHER = WeatherClient(
+    connect_timeout=float(os.environ.get("WEATHER_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.environ.get("WEATHER_READ_TIMEOUT", "5"))
+)
+OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY")
+
+# Airports do not move: coordinates by IATA code are kept for the life of the
+# process. Weather is cached per airport per time bucket, so every user asking
+# about DXB within the same bucket shares one upstream fetch.
+AIRPORT_COORDINATES_CACHE = TTLCache(ttl=float("inf"), max_entries=20000)
+WEATHER_BUCKET_SECONDS = int(os.environ.get("WEATHER_BUCKET_SECONDS", "1800"))
+WEATHER_CACHE = TTLCache(ttl=WEATHER_BUCKET_SECONDS, max_entries=5000)
+WEATHER_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("WEATHER_WORKERS", "8")),
+    thread_name_prefix="weather"
+)
+WEATHER_BATCH_TIMEOUT = float(os.environ.get("WEATHER_BATCH_TIMEOUT", "8"))
+MAX_WEATHER_AIRPORTS = 50
+IATA_PATTERN = re.compile(r"^[A-Z]{3}$")
+
+def airport_coordinates(data, iata_code):
+    """Coordinates of iata_code from an Amadeus airport search payload, or raise LookupError."""
+    for airport in data.get("data", []):
+        if airport.get("iataCode") == iata_code and airport.get("geoCode"):
+            return {
+                "lat": airport["geoCode"]["latitude"],
+                "lon": airport["geoCode"]["longitude"],
+                "name": airport.get("name"),
+                "city": (airport.get("address") or {}).get("cityName", "")
+            }
+    # Not cached, so an airport missing today is looked up again next time
+    raise LookupError(f"Could not find coordinates for airport {iata_code}")
+
+def fetch_coordinates(api_endpoint, authorization, iata_code):
+    return airport_coordinates(AMADEUS.search_airports(api_endpoint, authorization, iata_code).json(), iata_code)
+
+def fetch_weather(api_endpoint, authorization, api_key, iata_code):
+    coordinates = AIRPORT_COORDINATES_CACHE.get_or_load(
+        iata_code, partial(fetch_coordinates, api_endpoint, authorization, iata_code))
+    weather = WEATHER.current(api_key, coordinates["lat"], coordinates["lon"])
+    return format_weather(weather, coordinates, iata_code)
+
+def weather_bucket():
+    """The current time bucket and the seconds left until it ends."""
+    now = datetime.now().timestamp()
+    bucket = int(now // WEATHER_BUCKET_SECONDS)
+    return bucket, max((bucket + 1) * WEATHER_BUCKET_SECONDS - now, 1)
+
+def airport_weather(api_endpoint, authorization, api_key, iata_code, bucket, ttl):
+    # The entry only lives until the end of its bucket
+    return WEATHER_CACHE.get_or_load(
+        (iata_code, bucket),
+        partial(fetch_weather, api_endpoint, authorization, api_key, iata_code),
+        ttl=ttl
+    )
+
+def weather_params(data, token):
+    """Validate a weather batch request; return (api_endpoint, api_key, IATA codes) or raise ValueError."""
+    api_endpoint = data.get("api_endpoint")
+    api_key = OPENWEATHER_API_KEY or data.get("api_key")
+    codes = data.get("iata_codes")
+    if not token or not api_endpoint or not api_key or not isinstance(codes, list):
+        raise ValueError("Missing parameters")
+    codes = list(dict.fromkeys(str(code).strip().upper() for code in codes))
+    if len(codes) > MAX_WEATHER_AIRPORTS:
+        raise ValueError(f"At most {MAX_WEATHER_AIRPORTS} airports per request")
+    invalid = [code for code in codes if not IATA_PATTERN.match(code)]
+    if invalid:
+        raise ValueError(f"Invalid IATA codes: {', '.join(invalid)}")
+    return api_endpoint, api_key, codes
+
+def failed_weather(code, error):
+    if not isinstance(error, (AmadeusError, WeatherError, LookupError)):
+        logging.error(f"Error fetching weather for {code}: {str(error)}")
+    return {"error": str(error)}
+
+# Current weather for many airports in one call. Lookups run concurrently and
+# whatever has not finished within WEATHER_BATCH_TIMEOUT is reported as an
+# error for that airport (the fetch still completes and fills the cache).
+@app.route("/weather", methods=["POST"])
+def weather_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        token = request.headers.get("Authorization")
+        try:
+            api_endpoint, api_key, codes = weather_params(data, token)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        bucket, ttl = weather_bucket()
+        futures = {
+            WEATHER_EXECUTOR.submit(airport_weather, api_endpoint, token, api_key, code, bucket, ttl): code
+            for code in codes
+        }
+        done, _ = wait(futures, timeout=WEATHER_BATCH_TIMEOUT)
+
+        results = {}
+        for future, code in futures.items():
+            if future not in done:
+                results[code] = {"error": "Weather lookup timed out"}
+                continue
+            try:
+                results[code] = future.result()
+            except Exception as e:
+                results[code] = failed_weather(code, e)
+        return jsonify({"results": results})
+    except Exception as e:
+        logging.error(f"Error in weather lookup: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# METRICS ROUTES
+@app.before_request
+def start_request_timer():
+    g.request_started = perf_counter()
+
+# Streamed responses are timed to their first byte
+@app.after_request
+def observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+# Outbound calls are timed from the sessions' response hooks, so the clients need no changes
+def outbound_hook(service):
+    def hook(response, *args, **kwargs):
+        path = urlparse(response.request.url).path
+        OUTBOUND_SECONDS.observe(response.elapsed.total_seconds(), service=service, path=path, status=response.status_code)
+    return hook
+
+AMADEUS.session.hooks["response"].append(outbound_hook("amadeus"))
+WEATHER.session.hooks["response"].append(outbound_hook("openweather"))
+
+# Counts the app keeps anyway, read when /metrics is scraped
+CACHES = {
+    "airport_search": AIRPORT_SEARCH_CACHE,
+    "flight_delay": FLIGHT_DELAY_CACHE,
+    "airport_coordinates": AIRPORT_COORDINATES_CACHE,
+    "weather": WEATHER_CACHE
+}
+
+Collected("chatbot_cache_requests_total", "Cache lookups by result; coalesced lookups waited on another caller's load.", "counter",
+          lambda: [((name, result), getattr(cache, result)) for name, cache in CACHES.items() for result in ("hits", "misses", "coalesced")],
+          ["cache", "result"])
+Collected("chatbot_cache_entries", "Entries held by each cache.", "gauge",
+          lambda: [((name,), len(cache)) for name, cache in CACHES.items()], ["cache"])
+Collected("chatbot_airport_loads_total", "Airports loaded into the current data version.", "counter",
+          lambda: [((), DATASET.airports.loads)])
+Collected("chatbot_airport_evictions_total", "Airports unloaded from the current data version to stay within the memory budget.", "counter",
+          lambda: [((), DATASET.airports.evictions)])
+Collected("chatbot_airports_resident", "Airports currently loaded.", "gauge",
+          lambda: [((), len(DATASET.airports.resident()))])
+Collected("chatbot_airport_memory_bytes", "Approximate memory held by loaded airports.", "gauge",
+          lambda: [((), DATASET.airports.nbytes())])
+Collected("chatbot_log_records_dropped_total", "Log records dropped because the log queue was full.", "counter",
+          lambda: [((), LOG_HANDLER.dropped)])
+Collected("chatbot_sessions", "Active chat sessions.", "gauge",
+          lambda: [((), len(USER_STATE))])
+Collected("chatbot_sessions_total", "Chat sessions by how they started or finished.", "counter",
+          lambda: [((event,), getattr(USER_STATE, event)) for event in ("created", "ended", "expired", "evicted")],
+          ["event"])
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return app.response_class(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 # Serve static files and pages
 @app.route("/")
 def home():
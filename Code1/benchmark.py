@@ -0,0 +1,357 @@
+# Load test and benchmark for the chatbot's /query endpoint.
+#
+#     python benchmark.py --rows 2000 --airports 20 --conversations 500 --concurrency 16
+#     python benchmark.py --app-dir ../chatbot
+#     python benchmark.py --url http://localhost:5000
+#
+# A synthetic workbook and manifest are generated at the requested size (the
+# real sheet layouts, with --rows rows per sheet and --airports extra
+# airports), then scripted multi-turn conversations covering airport
+# selection, transport options and train dropdowns, facilities and visa
+# checks are replayed against /query at the requested concurrency. Each step
+# is timed and attributed to the handler that serves it. The report gives
+# p50/p95/p99 latency and throughput per handler, plus import time with and
+# without a cached snapshot. Conversations go through the Flask test client
+# by default, or through a running server with --url, in which case they are
+# scripted from the airports that server reports under /data/airports. Every
+# reply is checked against the kind expected for its turn, and error replies
+# (which the backend sends with status 200) count as failures. The exit
+# status is non-zero on any failed reply, or with --fail-p95-ms when any
+# handler's p95 exceeds the limit, so this can gate deploys.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time as timer
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time
+
+import numpy as np
+import pandas as pd
+
+HANDLERS = ["routing", "handle_transport", "handle_facilities", "handle_visa"]
+FACILITY_TYPES = ["Lounge", "Restaurant", "Spa", "Bar", "Cafe", "Duty free shop", "Pharmacy", "Bookstore", "Currency exchange", "Prayer room"]
+FACILITY_WORDS = ["quiet", "premium", "vegan", "family", "24 hour", "luxury", "quick", "local", "international", "relaxing", "coffee", "massage"]
+STATIONS = ["Airport", "KSR-Majestic", "Cantonment", "Yelahanka", "Yeshwanthpur", "Byappanahalli", "Malleshwaram", "Devanahalli", "Hebbal", "Whitefield"]
+VISA_COUNTRIES = ["Japan", "South Korea", "Germany", "France", "Australia", "Austria", "Brazil", "Canada", "Italy", "Spain", "Mexico", "Norway"]
+GCC_COUNTRIES = ["Bahrain", "Kuwait", "Oman", "Qatar", "Saudi Arabia"]
+VISA_QUERIES = ["Japan", "india", "oman", "Germny", "united states", "Atlantis"]
+FACILITY_QUERIES = ["lounge", "vegan restaurant", "spa", "coffee", "duty free", "quiet place to sleep"]
+# Text the backend replies with, still as HTTP 200, when a turn went wrong
+ERROR_REPLIES = ["An error occurred", "Please select an airport first", "Which airport do you need assistance with"]
+
+
+def facilities_sheet(airport, rows, rng):
+    types = rng.choice(FACILITY_TYPES, rows)
+    return pd.DataFrame({
+        "Airport": f"{airport} International Airport",
+        "Type": types,
+        "Name": [f"{kind} {i}" for i, kind in enumerate(types)],
+        "Description": [" ".join(rng.choice(FACILITY_WORDS, 4)) for _ in range(rows)],
+        "Location": [f"Terminal {rng.integers(1, 4)}" for _ in range(rows)]
+    })
+
+
+def transport_sheet(airport, option, rows, rng):
+    return pd.DataFrame({
+        "Airport": f"{airport} International Airport",
+        "name": [f"{option.title()} operator {i}" for i in range(rows)],
+        "description": [" ".join(rng.choice(FACILITY_WORDS, 3)) for _ in range(rows)],
+        "link": [f"https://example.com/{option.replace(' ', '-')}/{i}" for i in range(rows)]
+    })
+
+
+def train_sheet(rows, rng):
+    records = []
+    for i in range(rows):
+        stops = list(rng.choice(STATIONS, rng.integers(2, 6), replace=False))
+        departure = int(rng.integers(4 * 60, 22 * 60))
+        arrival = departure + 15 * len(stops)
+        records.append({
+            "Train no.": 6000 + i,
+            "Departure": stops[0],
+            "Departure time": time(departure // 60, departure % 60),
+            "Halt": ", ".join(stops[1:-1]) or "no stops",
+            "Arrival": stops[-1],
+            "Arrival Time": time(arrival // 60 % 24, arrival % 60)
+        })
+    return pd.DataFrame(records)
+
+
+def country_sheet(airport, countries, column="Country"):
+    return pd.DataFrame({"Airport": f"{airport} International Airport", column: countries})
+
+
+# Synthetic airport sheets keyed by sheet name, for one manifest layout
+def airport_sheets(airport, layout, rows, trains, rng):
+    sheets = {layout["facilities"]: facilities_sheet(airport, rows, rng)}
+    for option, sheet_name in layout["transport"].items():
+        if "train" in option:
+            sheets[sheet_name] = train_sheet(trains, rng)
+        else:
+            sheets[sheet_name] = transport_sheet(airport, option, rows, rng)
+    sheets[layout["visa"]] = country_sheet(airport, VISA_COUNTRIES)
+    if "GCC" in layout:
+        sheets[layout["GCC"]] = country_sheet(airport, GCC_COUNTRIES, column="country")
+    return sheets
+
+
+def generate_data(app_dir, directory, rows, trains, extra_airports, seed=0):
+    """Write a synthetic workbook and manifest; return their paths."""
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(app_dir, "airports.json"), encoding="utf-8") as f:
+        airports = json.load(f)["airports"]
+    template = next(entry for entry in airports.values() if "train" in entry["sheets"].get("transport", {}))
+    for k in range(extra_airports):
+        name = f"Benchtown {k}"
+        # Excel caps sheet names at 31 characters
+        sheets = {
+            "facilities": f"B{k} facilities",
+            "transport": {option: f"B{k} {option}" for option in template["sheets"]["transport"]},
+            "visa": f"B{k} visa"
+        }
+        airports[name] = {"aliases": [f"bench{k}"], "sheets": sheets}
+
+    workbook = os.path.join(directory, "bench.xlsx")
+    with pd.ExcelWriter(workbook) as writer:
+        for name, entry in airports.items():
+            for sheet_name, df in airport_sheets(name, entry["sheets"], rows, trains, rng).items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    manifest = os.path.join(directory, "bench.json")
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump({"airports": airports}, f, indent=4)
+    return workbook, manifest, airports
+
+
+def server_airports(url):
+    """Airports of a running server, shaped like manifest entries as far as conversations() needs."""
+    import requests
+    base = url.rstrip("/") + "/data/airports"
+    airports = {}
+    for airport in requests.get(base, timeout=30).json()["airports"]:
+        name = airport["name"]
+        entry = {"sheets": {}}
+        if "Transport" in airport["categories"]:
+            options = requests.get(f"{base}/{name}/transport", timeout=30).json()["buttons"]
+            entry["sheets"]["transport"] = dict.fromkeys(options)
+            stations = requests.get(f"{base}/{name}/trains/stations", timeout=30)
+            if stations.status_code == 200:
+                entry["stations"] = stations.json()["from_options"]
+        airports[name] = entry
+    return airports
+
+
+# Scripted conversations as lists of (message, handler serving it, reply
+# kinds expected from it)
+def conversations(airports, rng):
+    scripts = []
+    for name, entry in airports.items():
+        transport = entry["sheets"].get("transport", {})
+        options = [option for option in transport if "train" not in option]
+        transport_steps = [(option, "handle_transport", {"list"}) for option in options[:2]]
+        transport_steps.append(("operator 1", "handle_transport", {"list", "text"}))
+        if any("train" in option for option in transport):
+            start, end = rng.choice(entry.get("stations", STATIONS), 2, replace=False)
+            transport_steps += [("train", "handle_transport", {"dropdown"}), (f"from:{start} to:{end}", "handle_transport", {"list", "text"})]
+        scripts.append([(name, "routing", {"buttons"}), ("transport", "routing", {"buttons"}), *transport_steps])
+        scripts.append([(name, "routing", {"buttons"}), ("facilities", "routing", {"text"}),
+                        *[(q, "handle_facilities", {"list", "text"}) for q in FACILITY_QUERIES]])
+        scripts.append([(name, "routing", {"buttons"}), ("visa", "routing", {"text"}),
+                        *[(q, "handle_visa", {"text"}) for q in VISA_QUERIES]])
+    return scripts
+
+
+def reply_problem(status, reply, expected):
+    """Why a reply is not the one expected for its turn, or None if it is."""
+    if status != 200:
+        return f"status {status}"
+    if not isinstance(reply, dict):
+        return "reply is not a JSON object"
+    kind = reply.get("type") or ("buttons" if reply.get("buttons") else "text")
+    text = reply.get("response") if isinstance(reply.get("response"), str) else ""
+    if any(text.startswith(error) for error in ERROR_REPLIES):
+        return text
+    if kind not in expected:
+        return f"expected {' or '.join(sorted(expected))}, got {kind}: {text[:80]}"
+    return None
+
+
+# Sends messages to /query in-process through the Flask test client
+class TestClientTarget:
+    def __init__(self, backend):
+        self.app = backend.app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(payload):
+            response = client.post("/query", json=payload)
+            return response.status_code, response.get_json(silent=True)
+        return send
+
+
+# Sends messages to /query on a running server
+class HttpTarget:
+    def __init__(self, url):
+        self.url = url.rstrip("/") + "/query"
+
+    def session(self):
+        import requests
+        http = requests.Session()
+
+        def send(payload):
+            response = http.post(self.url, json=payload, timeout=30)
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, None
+        return send
+
+
+def replay(target, scripts, count, concurrency, seed=0):
+    """Replay count conversations; return {handler: [latency seconds]} and the wall time."""
+    rng = random.Random(seed)
+    plan = [rng.choice(scripts) for _ in range(count)]
+    samples = {handler: [] for handler in HANDLERS}
+    errors = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run(i):
+        if not hasattr(local, "send"):
+            local.send = target.session()
+        user_id = f"bench-{i}-{rng.random()}"
+        timings = []
+        for message, handler, expected in plan[i]:
+            start = timer.perf_counter()
+            status, reply = local.send({"user_id": user_id, "message": message})
+            elapsed = timer.perf_counter() - start
+            problem = reply_problem(status, reply, expected)
+            if problem:
+                # A failed turn is not a latency sample, however fast it was
+                errors.append((message, problem))
+            else:
+                timings.append((handler, elapsed))
+        local.send({"user_id": user_id, "message": "bye"})
+        with lock:
+            for handler, elapsed in timings:
+                samples[handler].append(elapsed)
+
+    started = timer.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(count)))
+    return samples, timer.perf_counter() - started, errors
+
+
+def summarize(samples, wall):
+    report = {}
+    for handler, latencies in samples.items():
+        if not latencies:
+            continue
+        ms = np.array(latencies) * 1000
+        report[handler] = {
+            "requests": len(ms),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "throughput_rps": round(len(ms) / wall, 1)
+        }
+    return report
+
+
+def import_time(app_dir, env):
+    """Seconds taken to import the backend in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import backend; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=app_dir, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted conversations against /query and report latency per handler.")
+    parser.add_argument("--app-dir", default=os.path.dirname(os.path.abspath(__file__)), help="directory holding backend.py and airports.json")
+    parser.add_argument("--rows", type=int, help="rows per facilities/transport sheet (default 500)")
+    parser.add_argument("--trains", type=int, help="rows per train sheet (default 100)")
+    parser.add_argument("--airports", type=int, help="synthetic airports added to the manifest's own (default 0)")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="replay against a running server instead of the test client")
+    parser.add_argument("--workbook", help="use this workbook instead of generating one")
+    parser.add_argument("--manifest", help="manifest to use with --workbook")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--fail-p95-ms", type=float, help="exit non-zero if any handler's p95 exceeds this")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.url and (args.rows is not None or args.trains is not None or args.airports is not None or args.workbook):
+        parser.error("--url replays against the server's own data; --rows, --trains, --airports and --workbook do not apply")
+    args.rows = 500 if args.rows is None else args.rows
+    args.trains = 100 if args.trains is None else args.trains
+    args.airports = 0 if args.airports is None else args.airports
+
+    app_dir = os.path.abspath(args.app_dir)
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    rng = np.random.default_rng(args.seed)
+    if args.url:
+        airports = server_airports(args.url)
+        print(f"Replaying against {args.url} with its {len(airports)} airports")
+    elif args.workbook:
+        workbook, manifest = os.path.abspath(args.workbook), os.path.abspath(args.manifest or os.path.join(app_dir, "airports.json"))
+        with open(manifest, encoding="utf-8") as f:
+            airports = json.load(f)["airports"]
+    else:
+        started = timer.perf_counter()
+        workbook, manifest, airports = generate_data(app_dir, work_dir, args.rows, args.trains, args.airports, args.seed)
+        print(f"Generated {len(airports)} airports, {args.rows} rows per sheet in {timer.perf_counter() - started:.1f}s: {workbook}")
+
+    report = {"config": vars(args), "startup": {}, "handlers": {}}
+    if not args.url:
+        env = dict(os.environ,
+                   AIRPORT_DATA_FILE=workbook,
+                   AIRPORT_MANIFEST=manifest,
+                   AIRPORT_SNAPSHOT_DIR=os.path.join(work_dir, "snapshots"),
+                   AIRPORT_DATA_WATCH_INTERVAL="0")
+        # The first import builds the snapshot, the second reuses it
+        report["startup"]["import_cold_s"] = round(import_time(app_dir, env), 3)
+        report["startup"]["import_warm_s"] = round(import_time(app_dir, env), 3)
+        os.environ.update(env)
+        sys.path.insert(0, app_dir)
+        import logging
+        import backend
+        logging.disable(logging.CRITICAL)
+        target = TestClientTarget(backend)
+    else:
+        target = HttpTarget(args.url)
+
+    scripts = conversations(airports, rng)
+    # One pass over every script first, so lazy loading is not in the numbers
+    replay(target, scripts, len(scripts), args.concurrency, args.seed)
+    samples, wall, errors = replay(target, scripts, args.conversations, args.concurrency, args.seed)
+    report["handlers"] = summarize(samples, wall)
+    report["wall_s"] = round(wall, 3)
+    report["errors"] = len(errors)
+
+    for name, seconds in report["startup"].items():
+        print(f"{name:>20}: {seconds:.3f}s")
+    print(f"{'handler':>20} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for handler, stats in report["handlers"].items():
+        print(f"{handler:>20} {stats['requests']:>9} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['throughput_rps']:>9}")
+    print(f"{args.conversations} conversations at concurrency {args.concurrency} in {wall:.2f}s, {len(errors)} errors")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    slow = [handler for handler, stats in report["handlers"].items()
+            if args.fail_p95_ms is not None and stats["p95_ms"] > args.fail_p95_ms]
+    for message, problem in errors[:10]:
+        print(f"  {message!r}: {problem}")
+    if slow or errors:
+        print(f"FAILED: p95 over {args.fail_p95_ms} ms for {', '.join(slow)}" if slow else f"FAILED: {len(errors)} failed replies")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+
+from fuzzywuzzy import fuzz, process
+
+
+# Offline registry of countries bundled with the app: canonical names, common
+# aliases, demonyms and ISO codes, all hashed by a normalised key so country
+# input is validated without any network call. Misspellings fall back to a
+# fuzzy match against the same keys.
+class CountryRegistry:
+    FUZZY_THRESHOLD = 85
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        self.entries = {entry["name"]: entry for entry in entries}
+        self.lookup = {}
+        self.codes = set()
+        # Earlier passes win when two countries share a key
+        for entry in entries:
+            self.lookup.setdefault(self.normalize(entry["name"]), entry["name"])
+        for entry in entries:
+            for code in [entry["iso2"], entry["iso3"]]:
+                self.codes.add(self.normalize(code))
+                self.lookup.setdefault(self.normalize(code), entry["name"])
+        for field in ["aliases", "demonyms"]:
+            for entry in entries:
+                for value in entry[field]:
+                    self.lookup.setdefault(self.normalize(value), entry["name"])
+        self.name_keys = [key for key in self.lookup if key not in self.codes]
+        self._resolve_key = lru_cache(maxsize=4096)(self._resolve_key)
+
+    @staticmethod
+    def normalize(text):
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+        text = re.sub(r"[.'’]", "", text)
+        text = re.sub(r"[^a-z0-9]+", " ", text).strip()
+        if text.startswith("the "):
+            text = text[4:]
+        return text
+
+    def resolve(self, text):
+        """Return the canonical country name for text, or None if it is not a country."""
+        if not isinstance(text, str):
+            return None
+        return self._resolve_key(self.normalize(text))
+
+    def _resolve_key(self, key):
+        if not key:
+            return None
+        if key in self.lookup:
+            return self.lookup[key]
+        # A country named inside a longer message, e.g. "i am from india"
+        words = key.split()
+        for size in range(min(len(words), 4), 0, -1):
+            for i in range(len(words) - size + 1):
+                window = " ".join(words[i:i + size])
+                if window in self.lookup and window not in self.codes:
+                    return self.lookup[window]
+        # Typo tolerance
+        match = process.extractOne(key, self.name_keys, scorer=fuzz.ratio, score_cutoff=self.FUZZY_THRESHOLD)
+        return self.lookup[match[0]] if match else None
+
+
+# Visa eligibility values, in the order handle_visa checks them
+VISA_ON_ARRIVAL = "visa_on_arrival"
+GCC_EXEMPT = "gcc_exempt"
+NOT_ELIGIBLE = "not_eligible"
+
+
+# Precomputed eligibility for one airport: canonical country -> status.
+# Sheet entries are resolved through the country registry once, so lookups
+# are a dict access instead of a scan over the visa sheets.
+def build_visa_eligibility(countries, airport_sheets):
+    eligibility = {}
+    for key, status in [("visa", VISA_ON_ARRIVAL), ("GCC", GCC_EXEMPT)]:
+        if key not in airport_sheets:
+            continue
+        for value in airport_sheets[key].iloc[:, 1].dropna():
+            country = countries.resolve(value)
+            if country is None:
+                logging.debug(f"Unrecognized country '{value}' in {key} sheet")
+                continue
+            eligibility.setdefault(country, status)
+    return eligibility
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# Delay prediction probability thresholds and the delay (in minutes) assumed
+# once a probability reaches each one; the same bands the results page uses
+DELAY_THRESHOLDS = np.array([0.15, 0.20, 0.25, 0.30])
+DELAY_MINUTES = np.array([0, 30, 60, 120, 180])
+
+
+def predicted_delay_minutes(probabilities):
+    """Map delay probabilities to predicted delay minutes; missing ones count as on time."""
+    probabilities = np.nan_to_num(np.asarray(probabilities, dtype=float), nan=0.0)
+    return DELAY_MINUTES[np.searchsorted(DELAY_THRESHOLDS, probabilities, side="right")]
+
+
+def duration_minutes(durations):
+    """Convert ISO 8601 durations such as "PT2H35M" to minutes (NaN where none was given)."""
+    for i, duration in enumerate(durations):
+        if duration is not None and (not isinstance(duration, str) or not duration.startswith("P")):
+            raise ValueError(f"Itinerary at index {i} has an invalid duration")
+    try:
+        minutes = pd.to_timedelta(pd.Series(durations, dtype=object), errors="raise").dt.total_seconds() / 60
+    except (ValueError, TypeError):
+        raise ValueError("Invalid itinerary duration")
+    return minutes.to_numpy(dtype=float)
+
+
+def segment_times(times):
+    """Parse segment timestamps as UTC datetimes; naive ones are taken to be UTC."""
+    if not all(isinstance(at, str) and at for at in times):
+        raise ValueError("Invalid segment time")
+    try:
+        return pd.to_datetime(pd.Series(times), utc=True, format="ISO8601", errors="raise").dt.tz_localize(None).to_numpy()
+    except (ValueError, TypeError):
+        raise ValueError("Invalid segment time")
+
+
+def _probability(prediction):
+    if not isinstance(prediction, dict) or prediction.get("predictionUnavailable"):
+        return np.nan
+    try:
+        return float(prediction.get("probability"))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# Scores a batch of itineraries in one pass. All segments are flattened into
+# column arrays so layovers, predicted delays and connection risk are computed
+# with array operations over the whole batch rather than per itinerary.
+#
+# Each itinerary is a dict with "segments" (flight-offer segments), the
+# matching "predictions" (as returned by the delay prediction endpoint) and
+# optionally "id" and "duration".
+def score_itineraries(itineraries):
+    counts = []
+    departures, arrivals, probabilities = [], [], []
+    for i, itinerary in enumerate(itineraries):
+        segments = itinerary.get("segments") if isinstance(itinerary, dict) else None
+        if not isinstance(segments, list) or not segments:
+            raise ValueError(f"Itinerary at index {i} has no segments")
+        predictions = itinerary.get("predictions") or []
+        try:
+            for j, segment in enumerate(segments):
+                departures.append(segment["departure"]["at"])
+                arrivals.append(segment["arrival"]["at"])
+                probabilities.append(_probability(predictions[j] if j < len(predictions) else None))
+        except (KeyError, TypeError):
+            raise ValueError(f"Itinerary at index {i} has an invalid segment")
+        counts.append(len(segments))
+
+    counts = np.array(counts)
+    n = len(counts)
+    if n == 0:
+        return []
+    owner = np.repeat(np.arange(n), counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    departure_times = segment_times(departures)
+    arrival_times = segment_times(arrivals)
+    delays = predicted_delay_minutes(probabilities)
+
+    # A connection joins segment k to segment k + 1 of the same itinerary
+    connection = np.flatnonzero(owner[:-1] == owner[1:])
+    connection_owner = owner[connection]
+    layovers = (departure_times[connection + 1] - arrival_times[connection]) / np.timedelta64(1, "m")
+    incoming_delay = delays[connection]
+    at_risk = incoming_delay >= layovers
+    # Share of the layover the predicted delay eats up, capped at a certain miss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        connection_risk = np.where(layovers > 0, np.clip(incoming_delay / layovers, 0, 1), 1.0)
+
+    risk = np.zeros(n)
+    np.maximum.at(risk, connection_owner, connection_risk)
+    risky_connections = np.bincount(connection_owner, weights=at_risk, minlength=n).astype(int)
+    min_layover = np.full(n, np.inf)
+    np.minimum.at(min_layover, connection_owner, layovers)
+    total_layover = np.bincount(connection_owner, weights=layovers, minlength=n)
+    max_delay = np.zeros(n)
+    np.maximum.at(max_delay, owner, delays)
+    # Arrival delay is what the final segment is predicted to add
+    arrival_delay = delays[starts + counts - 1]
+
+    durations = duration_minutes([
+        itinerary.get("duration") for itinerary in itineraries
+    ])
+    # Fall back to first departure -> last arrival when no duration was given
+    elapsed = (arrival_times[starts + counts - 1] - departure_times[starts]) / np.timedelta64(1, "m")
+    durations = np.where(np.isnan(durations), elapsed, durations)
+
+    # Safe itineraries first, then lower risk, smaller arrival delay, shorter trip
+    order = np.lexsort((durations, arrival_delay, risk, risky_connections > 0))
+
+    layovers_by_owner = np.split(layovers, np.searchsorted(connection_owner, np.arange(1, n)))
+    delays_by_owner = np.split(delays, starts[1:])
+    results = []
+    for rank, i in enumerate(order, start=1):
+        itinerary = itineraries[i]
+        results.append({
+            "rank": rank,
+            "index": int(i),
+            "id": itinerary.get("id"),
+            "at_risk": bool(risky_connections[i]),
+            "risky_connections": int(risky_connections[i]),
+            "risk": round(float(risk[i]), 3),
+            "layovers": [float(x) for x in layovers_by_owner[i]],
+            "min_layover": None if np.isinf(min_layover[i]) else float(min_layover[i]),
+            "total_layover": float(total_layover[i]),
+            "predicted_delays": [int(x) for x in delays_by_owner[i]],
+            "max_segment_delay": int(max_delay[i]),
+            "expected_arrival_delay": int(arrival_delay[i]),
+            "duration": float(durations[i])
+        })
+    return results
@@ -0,0 +1,26 @@
+import base64
+import json
+
+
+# Opaque continuation token for a paged listing. It carries the listing
+# itself (data version, airport, handler and message) and the offset of the
+# next page, so nothing is kept on the server between pages, and a cursor
+# from another data version can be recognised and refused.
+def encode_cursor(version, airport, query_type, message, offset):
+    payload = json.dumps([version, airport, query_type, message, offset], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Return (version, airport, query type, message, offset) from a cursor, or raise ValueError."""
+    if not isinstance(cursor, str):
+        raise ValueError("Invalid cursor")
+    try:
+        version, airport, query_type, message, offset = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not all(isinstance(value, str) for value in [version, airport, query_type, message]):
+        raise ValueError("Invalid cursor")
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return version, airport, query_type, message, offset
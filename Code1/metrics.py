@@ -0,0 +1,147 @@
+import bisect
+import contextvars
+import functools
+import math
+import threading
+import time
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current_timer = contextvars.ContextVar("current_timer", default=None)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# Metrics of one process, rendered in the Prometheus text format. With several
+# worker processes every worker keeps its own and a scrape sees one worker.
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# Latency histogram with fixed buckets. observe() is a bisect and a few
+# additions under a lock, cheap enough to leave on for every request.
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # Label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the time spent inside it."""
+        return Timer(self, labels)
+
+    def timed(self, **labels):
+        """Decorator observing the duration of every call."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with Timer(self, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, count
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = dict(labels)
+
+    def __enter__(self):
+        self._token = _current_timer.set(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self._started
+        _current_timer.reset(self._token)
+        self.histogram.observe(elapsed, **self.labels)
+
+
+def set_labels(**labels):
+    """Update the labels of the innermost running timer, e.g. with the branch a handler took."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.labels.update(labels)
+
+
+# Metric whose samples are read from application state when scraped, for
+# values the app already counts (cache hits, loaded airports, sessions), so
+# the request path pays nothing for them. collect() returns
+# (label values, value) pairs.
+class Collected:
+    def __init__(self, name, help, type, collect, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        registry.register(self)
+
+    def samples(self):
+        for key, value in self.collect():
+            yield "", self.labelnames, tuple(key), value
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+
+# Thread-safe token bucket shared by every request of the process. Tokens
+# refill continuously at `rate` per second up to `capacity`, so short bursts
+# go out immediately while the sustained rate stays under the upstream quota.
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Caller holds the lock
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available right now."""
+        return not self._take()
+
+    def _take(self):
+        """Take a token and return 0, or return the seconds until one is due."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """Block until a token is available; return False if timeout runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait on the event loop, rather than in a thread, until a token is available."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
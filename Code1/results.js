@@ -5,54 +5,8 @@ const AMADEUS_API_ENDPOINT = 'https://test.api.amadeus.com';
 const OPENWEATHER_API_KEY = config.OPENWEATHER_API_KEY;
 const OPENWEATHER_API_ENDPOINT = 'https://api.openweathermap.org/data/2.5';
 
-// Rate limiter class to handle API rate limits
-class RateLimiter {
-    constructor(requestsPerSecond = 1) {
-        this.queue = [];
-        this.processing = false;
-        this.lastRequestTime = 0;
-        this.minInterval = 1000 / requestsPerSecond; // minimum time between requests in ms
-    }
-
-    async addToQueue(fn) {
-        return new Promise((resolve, reject) => {
-            this.queue.push({ fn, resolve, reject });
-            this.processQueue();
-        });
-    }
-
-    async processQueue() {
-        if (this.processing || this.queue.length === 0) return;
-
-        this.processing = true;
-
-        const now = Date.now();
-        const timeToWait = Math.max(0, this.lastRequestTime + this.minInterval - now);
-
-        await new Promise(resolve => setTimeout(resolve, timeToWait));
-
-        const { fn, resolve, reject } = this.queue.shift();
-        this.lastRequestTime = Date.now();
-
-        try {
-            const result = await fn();
-            resolve(result);
-        } catch (error) {
-            reject(error);
-        }
-
-        this.processing = false;
-        this.processQueue();
-    }
-}
-
-
-// Create a global rate limiter instance (1 request per second)
-const rateLimiter = new RateLimiter(1);
-
-// Cache to store airport coordinates and weather data
-const airportCoordinatesCache = {};
-const weatherDataCache = {};
+// Pending weather lookups by IATA code for this page
+const weatherRequests = {};
 
 // Function to get Amadeus API token
 async function getAmadeusToken() {
@@ -81,105 +35,51 @@ async function getAmadeusToken() {
     }
 }
 
-// New function to get airport coordinates
-async function getAirportCoordinates(iataCode) {
-    // Check cache first
-    if (airportCoordinatesCache[iataCode]) {
-        return airportCoordinatesCache[iataCode];
-    }
+// Function to fetch weather for several airports in one backend request.
+// The backend caches coordinates and weather for all users, so this only
+// dedupes lookups within the page.
+function prefetchAirportWeather(iataCodes) {
+    const codes = [...new Set(iataCodes)].filter(code => !weatherRequests[code]);
+    if (codes.length === 0) return;
 
-    try {
+    const batch = (async () => {
         const token = await getAmadeusToken();
-        const response = await fetch(
-            `${AMADEUS_API_ENDPOINT}/v1/reference-data/locations?subType=AIRPORT&keyword=${iataCode}`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`
-                }
-            }
-        );
+        const response = await fetch('/weather', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                api_endpoint: AMADEUS_API_ENDPOINT,
+                api_key: OPENWEATHER_API_KEY,
+                iata_codes: codes
+            })
+        });
 
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
         const data = await response.json();
-        if (data.data && data.data.length > 0) {
-            const airport = data.data.find(item => item.iataCode === iataCode);
-            if (airport && airport.geoCode) {
-                const coordinates = {
-                    lat: airport.geoCode.latitude,
-                    lon: airport.geoCode.longitude,
-                    name: airport.name,
-                    city: airport.address?.cityName || ''
-                };
-                // Save to cache
-                airportCoordinatesCache[iataCode] = coordinates;
-                return coordinates;
-            }
-        }
-        throw new Error(`Could not find coordinates for airport ${iataCode}`);
-    } catch (error) {
-        console.error(`Error fetching airport coordinates for ${iataCode}:`, error);
-        return null;
-    }
+        return data.results;
+    })();
+
+    codes.forEach(code => {
+        weatherRequests[code] = batch
+            .then(results => results[code] || { error: `No weather returned for ${code}` })
+            .catch(error => {
+                console.error(`Error fetching weather for airport ${code}:`, error);
+                delete weatherRequests[code];
+                return { error: `Could not get weather data: ${error.message}` };
+            });
+    });
 }
 
-// New function to get weather data for an airport
+// Function to get weather data for an airport
 async function getAirportWeather(iataCode) {
-    try {
-        // First get the coordinates of the airport
-        const coordinates = await getAirportCoordinates(iataCode);
-        if (!coordinates) {
-            return { error: `Could not get coordinates for airport ${iataCode}` };
-        }
-
-        // Check cache using coordinates as key
-        const cacheKey = `${coordinates.lat},${coordinates.lon}`;
-        const now = Date.now();
-        if (weatherDataCache[cacheKey] && (now - weatherDataCache[cacheKey].timestamp) < 30 * 60 * 1000) {
-            // Return cached data if less than 30 minutes old
-            return weatherDataCache[cacheKey].data;
-        }
-
-        // Fetch weather data from OpenWeatherMap
-        const response = await fetch(
-            `${OPENWEATHER_API_ENDPOINT}/weather?lat=${coordinates.lat}&lon=${coordinates.lon}&units=metric&appid=${OPENWEATHER_API_KEY}`
-        );
-
-        if (!response.ok) {
-            throw new Error(`Weather API error! status: ${response.status}`);
-        }
-
-        const weatherData = await response.json();
-        
-        // Format the weather data
-        const formattedWeather = {
-            location: coordinates.name || `${iataCode} Airport`,
-            city: coordinates.city,
-            temperature: Math.round(weatherData.main.temp),
-            feels_like: Math.round(weatherData.main.feels_like),
-            description: weatherData.weather[0].description,
-            icon: weatherData.weather[0].icon,
-            humidity: weatherData.main.humidity,
-            wind_speed: weatherData.wind.speed,
-            pressure: weatherData.main.pressure,
-            visibility: weatherData.visibility / 1000, // Convert to km
-            timestamp: new Date(weatherData.dt * 1000).toLocaleString(),
-            sunrise: new Date(weatherData.sys.sunrise * 1000).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'}),
-            sunset: new Date(weatherData.sys.sunset * 1000).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})
-        };
-
-        // Save to cache
-        weatherDataCache[cacheKey] = {
-            data: formattedWeather,
-            timestamp: now
-        };
-
-        return formattedWeather;
-    } catch (error) {
-        console.error(`Error fetching weather for airport ${iataCode}:`, error);
-        return { error: `Could not get weather data: ${error.message}` };
-    }
+    prefetchAirportWeather([iataCode]);
+    return weatherRequests[iataCode];
 }
 
 // Function to search for flights
@@ -212,66 +112,70 @@ async function searchFlights(origin, destination, date) {
     }
 }
 
-// Function to get flight delay prediction
-async function getFlightDelayPrediction(originLocationCode, destinationLocationCode, departureDateTime, carrierCode, flightNumber) {
-    return rateLimiter.addToQueue(async () => {
-        try {
-            const token = await getAmadeusToken();
-
-            const departureDateObj = new Date(departureDateTime);
-            const departureDate = departureDateObj.toISOString().split('T')[0];
-            const hours = String(departureDateObj.getHours()).padStart(2, '0');
-            const minutes = String(departureDateObj.getMinutes()).padStart(2, '0');
-            const departureTime = `${hours}:${minutes}:00`;
-
-            const arrivalDateObj = new Date(departureDateObj.getTime() + (3 * 60 * 60 * 1000)); // Assuming 3-hour flight
-            const arrivalDate = arrivalDateObj.toISOString().split('T')[0];
-            const arrivalHours = String(arrivalDateObj.getHours()).padStart(2, '0');
-            const arrivalMinutes = String(arrivalDateObj.getMinutes()).padStart(2, '0');
-            const arrivalTime = `${arrivalHours}:${arrivalMinutes}:00`;
-
-            const params = new URLSearchParams({
-                originLocationCode: originLocationCode.toUpperCase(),
-                destinationLocationCode: destinationLocationCode.toUpperCase(),
-                departureDate,
-                departureTime,
-                arrivalDate,
-                arrivalTime,
-                aircraftCode: '320', // Ensure this matches the actual aircraft
-                carrierCode: carrierCode.toUpperCase(),
-                flightNumber: flightNumber.toString(),
-                duration: 'PT3H'
-            });
+// The backend rejects batches larger than this (MAX_DELAY_SEGMENTS)
+const MAX_DELAY_SEGMENTS = 200;
 
-            const response = await fetch(
-                `${AMADEUS_API_ENDPOINT}/v1/travel/predictions/flight-delay?${params.toString()}`,
-                {
-                    headers: {
-                        'Authorization': `Bearer ${token}`,
-                        'Accept': 'application/json'
-                    }
-                }
-            );
+// Function to get delay predictions for a list of segments, at most
+// MAX_DELAY_SEGMENTS per request. Returns one promise per segment; each
+// resolves as soon as the backend streams back the prediction for that segment.
+function getFlightDelayPredictions(segments) {
+    const resolvers = [];
+    const predictions = segments.map(() => new Promise(resolve => resolvers.push(resolve)));
 
-            if (!response.ok) {
-                const errorData = await response.json();
-                console.error("API Error Response:", errorData);
+    for (let offset = 0; offset < segments.length; offset += MAX_DELAY_SEGMENTS) {
+        const chunk = segments.slice(offset, offset + MAX_DELAY_SEGMENTS);
+        streamFlightDelayPredictions(chunk, resolvers.slice(offset, offset + chunk.length));
+    }
 
-                // Handle specific error for "Data not seen at training time"
-                if (errorData.errors?.[0]?.detail?.includes("Data not seen at training time")) {
-                    return { predictionUnavailable: true, error: "No historical data available for this flight." };
-                }
+    return predictions;
+}
 
-                throw new Error(`API Error: ${errorData.errors?.[0]?.detail || 'Unknown error'}`);
-            }
+// Post one batch of segments and resolve resolvers[i] with the prediction
+// for chunk[i] as its line arrives
+async function streamFlightDelayPredictions(chunk, resolvers) {
+    const settleAll = (value) => resolvers.forEach(resolve => resolve(value));
+    try {
+        const token = await getAmadeusToken();
+        const response = await fetch('/amadeus/flight-delay/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({
+                api_endpoint: AMADEUS_API_ENDPOINT,
+                segments: chunk
+            })
+        });
 
-            const data = await response.json();
-            return data.data[0];
-        } catch (error) {
-            console.error('Error fetching delay prediction:', error);
-            return { predictionUnavailable: true, error: error.message };
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
         }
-    });
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const { indexes, prediction } = JSON.parse(line);
+            indexes.forEach(index => resolvers[index](prediction));
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered);
+    } catch (error) {
+        console.error('Error fetching delay predictions:', error);
+        settleAll({ predictionUnavailable: true, error: error.message });
+    }
+    // Anything the stream did not cover is unavailable (resolving twice is a no-op)
+    settleAll({ predictionUnavailable: true, error: 'Prediction Unavailable' });
 }
 
 // Function to format duration
@@ -366,7 +270,7 @@ function getWeatherIconHTML(iconCode) {
     return `<img src="https://openweathermap.org/img/wn/${iconCode}@2x.png" alt="Weather icon" class="weather-icon">`;
 }
 
-async function createFlightCard(flight) {
+async function createFlightCard(flight, segmentPredictions) {
     if (!flight.itineraries || !flight.itineraries[0].segments) {
         console.error("Invalid flight data:", flight);
         return "";
@@ -429,21 +333,9 @@ async function createFlightCard(flight) {
     for (let i = 0; i < segments.length; i++) {
         const segment = segments[i];
         
-        // Get delay prediction for this segment
-        let delayPrediction;
-        try {
-            delayPrediction = await getFlightDelayPrediction(
-                segment.departure.iataCode,
-                segment.arrival.iataCode,
-                segment.departure.at,
-                segment.carrierCode,
-                segment.number
-            );
-            delayPredictions.push(delayPrediction);
-        } catch (error) {
-            console.error('Error getting delay prediction:', error);
-            delayPredictions.push({ predictionUnavailable: true, error: error.message });
-        }
+        // Wait for this segment's prediction from the batch request
+        const delayPrediction = await segmentPredictions[i];
+        delayPredictions.push(delayPrediction);
 
         // Create segment display
         let segmentDelayPrediction = '';
@@ -543,13 +435,30 @@ async function displayFlights(flights) {
 
     container.innerHTML = '<div class="loading">Loading flight information...</div>';
 
+    // Request delay predictions for every segment of every flight up front
+    const validFlights = flights.filter(flight => flight.itineraries && flight.itineraries[0].segments);
+    prefetchAirportWeather(validFlights.map(flight => {
+        const segments = flight.itineraries[0].segments;
+        return segments[segments.length - 1].arrival.iataCode;
+    }));
+    const allPredictions = getFlightDelayPredictions(
+        validFlights.flatMap(flight => flight.itineraries[0].segments)
+    );
+    const predictionsByFlight = new Map();
+    let offset = 0;
+    validFlights.forEach(flight => {
+        const count = flight.itineraries[0].segments.length;
+        predictionsByFlight.set(flight, allPredictions.slice(offset, offset + count));
+        offset += count;
+    });
+
     // Process flights in smaller batches
     const batchSize = 3;
     const flightCards = [];
 
     for (let i = 0; i < flights.length; i += batchSize) {
         const batch = flights.slice(i, i + batchSize);
-        const batchCards = await Promise.all(batch.map(flight => createFlightCard(flight)));
+        const batchCards = await Promise.all(batch.map(flight => createFlightCard(flight, predictionsByFlight.get(flight))));
         flightCards.push(...batchCards);
 
         // Update the display after each batch
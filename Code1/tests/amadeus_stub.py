@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from amadeus_client import AIRPORT_SEARCH_PATH, FLIGHT_DELAY_PATH, TOKEN_PATH
+
+
+# A local stand-in for the Amadeus API. It issues numbered tokens, answers
+# airport searches and delay predictions, and records every call so tests can
+# count upstream requests and connections. Per flight number a test can set
+# a response delay or make the model answer that it has no training data.
+class AmadeusStub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []  # (path, query, Authorization header, monotonic time)
+        self.connections = 0
+        self.tokens_issued = 0
+        self.token_delay = 0.0
+        self.expires_in = 1799
+        self.delay = 0.0  # Applied to every GET
+        self.flight_delays = {}  # Flight number -> seconds before answering
+        self.untrained = set()  # Flight numbers without a prediction
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def count(self, path):
+        with self.lock:
+            return sum(1 for call in self.calls if call[0] == path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _record(self, path, query, authorization):
+        with self.lock:
+            self.calls.append((path, query, authorization, time.monotonic()))
+
+    def _token(self):
+        time.sleep(self.token_delay)
+        with self.lock:
+            self.tokens_issued += 1
+            number = self.tokens_issued
+        return 200, {"access_token": f"tok{number}", "token_type": "Bearer", "expires_in": self.expires_in}
+
+    def _prediction(self, query):
+        flight = query.get("flightNumber")
+        time.sleep(self.flight_delays.get(flight, 0))
+        if flight in self.untrained:
+            return 400, {"errors": [{"status": 400, "detail": "Data not seen at training time"}]}
+        return 200, {"data": [{"result": "LESS_THAN_30_MINUTES", "probability": "0.8", "flight": flight}]}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path = urlparse(self.path).path
+                stub._record(path, {}, None)
+                if path == TOKEN_PATH:
+                    return self._send(*stub._token())
+                self._send(404, {})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                authorization = self.headers.get("Authorization")
+                stub._record(url.path, query, authorization)
+                time.sleep(stub.delay)
+                if not (authorization or "").startswith("Bearer "):
+                    return self._send(401, {"errors": [{"status": 401, "detail": "Invalid access token"}]})
+                if url.path == AIRPORT_SEARCH_PATH:
+                    return self._send(200, {"data": [{"iataCode": "XXX", "name": query.get("keyword")}]})
+                if url.path == FLIGHT_DELAY_PATH:
+                    return self._send(*stub._prediction(query))
+                self._send(404, {})
+
+        return Handler
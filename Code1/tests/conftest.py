@@ -0,0 +1,32 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported flat, as when running from Code1, and the
+# test helpers next to this file
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+sys.path.insert(0, TESTS)
+
+
+# The Flask app loads the bundled workbook on import; the file watcher is
+# switched off so the tests don't leave a polling thread behind
+@pytest.fixture(scope="session")
+def backend():
+    os.environ.setdefault("AIRPORT_DATA_WATCH_INTERVAL", "0")
+    return importlib.import_module("backend")
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def amadeus_stub():
+    from amadeus_stub import AmadeusStub
+    stub = AmadeusStub()
+    yield stub
+    stub.close()
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+import requests
+
+import amadeus_client
+from amadeus_client import AIRPORT_SEARCH_PATH, TOKEN_PATH, AmadeusClient, AmadeusError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(amadeus_client.time, "monotonic", clock)
+    return clock
+
+
+def test_tokens_are_cached_per_credentials(amadeus_stub):
+    client = AmadeusClient()
+    first = client.get_token(amadeus_stub.url, "id", "secret")
+    assert first["access_token"] == "tok1"
+    assert client.get_token(amadeus_stub.url + "/", "id", "secret")["access_token"] == "tok1"
+    assert client.get_token(amadeus_stub.url, "id", "other")["access_token"] == "tok2"
+    assert amadeus_stub.count(TOKEN_PATH) == 2
+
+
+def test_concurrent_refreshes_make_one_upstream_call(amadeus_stub):
+    amadeus_stub.token_delay = 0.2
+    client = AmadeusClient()
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(client.get_token(amadeus_stub.url, "id", "secret")))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [token["access_token"] for token in tokens] == ["tok1"] * 10
+    assert amadeus_stub.count(TOKEN_PATH) == 1
+
+
+def test_token_is_refreshed_within_the_margin_of_expiry(amadeus_stub, clock):
+    amadeus_stub.expires_in = 100
+    client = AmadeusClient(refresh_margin=60)
+    assert client.get_token(amadeus_stub.url, "id", "secret")["access_token"] == "tok1"
+    clock.now += 39
+    token = client.get_token(amadeus_stub.url, "id", "secret")
+    assert token["access_token"] == "tok1"
+    # expires_in counts down so callers don't hold the token past its expiry
+    assert token["expires_in"] == 61
+    clock.now += 1
+    assert client.get_token(amadeus_stub.url, "id", "secret")["access_token"] == "tok2"
+    assert amadeus_stub.count(TOKEN_PATH) == 2
+
+
+def test_issued_and_accepted_tokens_are_trusted(amadeus_stub):
+    client = AmadeusClient()
+    token = client.get_token(amadeus_stub.url, "id", "secret")
+    assert client.trusts(f"Bearer {token['access_token']}")
+    assert not client.trusts("Bearer elsewhere")
+    client.search_airports(amadeus_stub.url, "Bearer elsewhere", "lon")
+    assert client.trusts("Bearer elsewhere")
+    with pytest.raises(AmadeusError) as error:
+        client.search_airports(amadeus_stub.url, "Basic nope", "lon")
+    assert error.value.status_code == 401
+    assert error.value.detail == "Invalid access token"
+    assert not client.trusts("Basic nope")
+
+
+def test_slow_upstream_calls_time_out(amadeus_stub):
+    amadeus_stub.delay = 1
+    client = AmadeusClient(read_timeout=0.1)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.search_airports(amadeus_stub.url, "Bearer tok", "lon")
+
+
+def test_calls_reuse_pooled_connections(amadeus_stub):
+    client = AmadeusClient()
+    token = client.get_token(amadeus_stub.url, "id", "secret")
+    for keyword in ["lon", "par", "nyc"]:
+        response = client.search_airports(amadeus_stub.url, f"Bearer {token['access_token']}", keyword)
+        assert response.json()["data"][0]["name"] == keyword
+    assert amadeus_stub.count(AIRPORT_SEARCH_PATH) == 3
+    assert amadeus_stub.connections == 1
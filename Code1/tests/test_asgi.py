@@ -0,0 +1,48 @@
+import asyncio
+import importlib
+
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("httpx")
+from starlette.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def asgi(backend):
+    return importlib.import_module("asgi")
+
+
+def run(middleware, path):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"])
+
+
+def test_data_version_is_stamped_on_native_routes_only(backend, asgi):
+    async def native(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+
+    async def flask(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"X-Data-Version", b"pinned")]})
+
+    middleware = asgi.DataVersionMiddleware(native, paths=["/weather"])
+    assert run(middleware, "/weather")[b"x-data-version"] == backend.DATASET.version.encode()
+    assert b"x-data-version" not in run(middleware, "/query")
+    # A version the wrapped app set itself is kept, never overwritten
+    assert run(asgi.DataVersionMiddleware(flask, paths=["/weather"]), "/weather") == {b"X-Data-Version": b"pinned"}
+
+
+def test_served_responses_carry_one_data_version(backend, asgi):
+    with TestClient(asgi.app) as client:
+        native = client.post("/amadeus/token", json={})
+        assert native.status_code == 400
+        assert native.headers.get_list("x-data-version") == [backend.DATASET.version]
+
+        flask = client.get("/data/version")
+        assert flask.headers.get_list("x-data-version") == [flask.json()["version"]]
@@ -0,0 +1,62 @@
+import random
+
+import pandas as pd
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+WORDS = ["lounge", "spa", "coffee", "burger", "duty", "free", "shop", "gate", "prayer", "room",
+         "wifi", "charging", "pharmacy", "bank", "exchange", "sleep", "pod", "kids", "play", "bar"]
+TYPES = ["Lounge", "Restaurant", "Shop", "Service"]
+
+
+@pytest.fixture(scope="module")
+def facilities():
+    rng = random.Random(7)
+    return pd.DataFrame({
+        "Type": [rng.choice(TYPES) for _ in range(200)],
+        "Name": [" ".join(rng.sample(WORDS, 2)).title() for _ in range(200)],
+        "Description": [" ".join(rng.choices(WORDS, k=rng.randint(3, 12))) for _ in range(200)]
+    })
+
+
+@pytest.fixture(scope="module")
+def index(backend, facilities):
+    return backend.FacilityIndex(facilities, backend.SheetPayload(facilities))
+
+
+def brute_force(index, facilities, message):
+    # Score every row on its own with the same vocabulary
+    texts = (facilities["Type"] + " " + facilities["Name"] + " " + facilities["Description"]).tolist()
+    similarity = cosine_similarity(index.vectorizer.transform(texts), index.vectorizer.transform([message]))
+    return similarity.ravel().tolist()
+
+
+@pytest.mark.parametrize("message", ["lounge", "coffee bar", "duty free shop", "sleep pod wifi", "kids play room"])
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_top_k_matches_a_brute_force_scan(index, facilities, message, k):
+    scores = brute_force(index, facilities, message)
+    expected = sorted(scores, reverse=True)[:k]
+    results = index.search(message, k=k)
+    assert [score for _, score in results] == pytest.approx(expected)
+    # Ties may be broken either way, but every id must carry its own score
+    assert len({row_id for row_id, _ in results}) == k
+    for row_id, score in results:
+        assert score == pytest.approx(scores[row_id])
+
+
+def test_k_larger_than_the_sheet_returns_every_row(backend, facilities):
+    small = facilities.head(3)
+    index = backend.FacilityIndex(small, backend.SheetPayload(small))
+    assert sorted(row_id for row_id, _ in index.search("lounge", k=10)) == [0, 1, 2]
+
+
+def test_unformatted_sheet_has_no_index(backend):
+    df = pd.DataFrame({"Name": ["Spa"]})
+    index = backend.FacilityIndex(df, backend.SheetPayload(df))
+    assert not index.formatted
+    assert index.search("spa") == []
+
+
+def test_filter_by_type_keeps_sheet_order(index, facilities):
+    expected = [i for i, value in enumerate(facilities["Type"]) if value == "Lounge"][:5]
+    assert index.filter_by_type("lounge") == expected
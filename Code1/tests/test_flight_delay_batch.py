@@ -0,0 +1,124 @@
+import json
+import time
+
+import pytest
+
+from amadeus_client import FLIGHT_DELAY_PATH
+from rate_limiter import TokenBucket
+from ttl_cache import TTLCache
+
+
+def segment(number, departure="2026-11-01T08:00:00"):
+    return {
+        "departure": {"iataCode": "LHR", "at": departure},
+        "arrival": {"iataCode": "JFK", "at": "2026-11-01T16:00:00"},
+        "carrierCode": "BA",
+        "number": str(number)
+    }
+
+
+@pytest.fixture
+def token(client, amadeus_stub):
+    response = client.post("/amadeus/token", json={
+        "client_id": "id", "client_secret": "secret", "api_endpoint": amadeus_stub.url
+    })
+    return f"Bearer {response.get_json()['access_token']}"
+
+
+@pytest.fixture
+def predict(client, amadeus_stub, token):
+    def predict(segments, authorization=token):
+        response = client.post("/amadeus/flight-delay/batch", headers={"Authorization": authorization},
+                               json={"api_endpoint": amadeus_stub.url, "segments": segments})
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return predict
+
+
+def flights(lines):
+    return [line["prediction"].get("flight") for line in lines]
+
+
+def test_identical_segments_are_fetched_once(predict, amadeus_stub):
+    lines = predict([segment(1), segment(2), segment(1)])
+    assert sorted(line["indexes"] for line in lines) == [[0, 2], [1]]
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 2
+
+
+def test_repeated_segments_are_answered_from_the_cache(backend, predict, amadeus_stub):
+    predict([segment(1), segment(2)])
+    hits = backend.FLIGHT_DELAY_CACHE.hits
+    lines = predict([segment(2), segment(1)])
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 2
+    assert backend.FLIGHT_DELAY_CACHE.hits == hits + 2
+    assert {line["indexes"][0]: line["prediction"]["flight"] for line in lines} == {0: "2", 1: "1"}
+
+
+def test_expired_predictions_are_fetched_again(backend, predict, amadeus_stub, monkeypatch):
+    monkeypatch.setattr(backend, "FLIGHT_DELAY_CACHE", TTLCache(ttl=0.2, max_entries=10))
+    predict([segment(1)])
+    predict([segment(1)])
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 1
+    time.sleep(0.3)
+    predict([segment(1)])
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 2
+
+
+def test_upstream_calls_share_the_token_bucket(backend, predict, amadeus_stub, monkeypatch):
+    monkeypatch.setattr(backend, "FLIGHT_DELAY_LIMITER", TokenBucket(rate=20, capacity=1))
+    predict([segment(n) for n in range(5)])
+    times = sorted(call[3] for call in amadeus_stub.calls if call[0] == FLIGHT_DELAY_PATH)
+    assert len(times) == 5
+    # One call straight away, then one every 50ms
+    assert times[-1] - times[0] >= 0.18
+
+
+def test_lines_stream_cached_first_then_as_predictions_complete(client, predict, amadeus_stub, token):
+    predict([segment(1)])
+    amadeus_stub.flight_delays["2"] = 0.5
+    started = time.monotonic()
+    response = client.post("/amadeus/flight-delay/batch", headers={"Authorization": token},
+                           json={"api_endpoint": amadeus_stub.url, "segments": [segment(2), segment(3), segment(1)]})
+    chunks = iter(response.response)
+    first = json.loads(next(chunks))
+    # The cached line goes out before the slow upstream call has finished
+    assert time.monotonic() - started < 0.4
+    lines = [first] + [json.loads(chunk) for chunk in chunks]
+    assert flights(lines) == ["1", "3", "2"]
+    assert [line["indexes"] for line in lines] == [[2], [1], [0]]
+
+
+def test_flights_without_training_data_are_cached_as_unavailable(predict, amadeus_stub):
+    amadeus_stub.untrained.add("7")
+    for _ in range(2):
+        [line] = predict([segment(7)])
+        assert line["prediction"] == {
+            "predictionUnavailable": True,
+            "error": "No historical data available for this flight."
+        }
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 1
+
+
+def test_other_upstream_errors_are_reported_and_not_cached(predict, amadeus_stub):
+    for _ in range(2):
+        [line] = predict([segment(1)], authorization="Basic nope")
+        assert line["prediction"] == {"predictionUnavailable": True, "error": "Invalid access token"}
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 2
+
+
+@pytest.mark.parametrize("endpoint, segments, error", [
+    (False, [segment(1)], "Missing parameters"),
+    (True, "LHR-JFK", "Missing parameters"),
+    (True, [segment(1), {"departure": {}}], "Invalid segment at index 1"),
+    (True, [segment(1, departure="soon")], "Invalid segment at index 0"),
+    (True, [segment(n) for n in range(201)], "At most 200 segments per request"),
+])
+def test_invalid_or_oversized_batches_are_rejected(client, amadeus_stub, token, endpoint, segments, error):
+    payload = {"segments": segments}
+    if endpoint:
+        payload["api_endpoint"] = amadeus_stub.url
+    response = client.post("/amadeus/flight-delay/batch", headers={"Authorization": token}, json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+    assert amadeus_stub.count(FLIGHT_DELAY_PATH) == 0
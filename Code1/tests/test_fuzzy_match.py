@@ -0,0 +1,56 @@
+import pytest
+from fuzzywuzzy import fuzz, process
+
+import fuzzy_match
+from fuzzy_match import FuzzyMatcher, default_process
+
+TRANSPORT_OPTIONS = ["bus", "car rental", "taxis", "train", "services", "metro", "airport shuttle", "limousine"]
+CELLS = [
+    "lounge", "080 lounge", "restaurant", "cafe coffee day", "duty free", "spa and salon", "bakery",
+    "tea coffee", "leather goods, bags", "cosmetics,gifts,cute items", "perfume shop", "", "24 hour pharmacy"
+]
+QUERIES = [
+    "bus", "i need a taxi", "car", "rental car please", "trian", "metro station", "shuttle", "limo", "services",
+    "xyz", "a", "lounge", "coffee", "duty-free shop", "salon", "spa", "perfume", "bags", "pharmacy open 24 hour"
+]
+
+
+@pytest.fixture(params=[True, False], ids=["rapidfuzz", "fuzzywuzzy-only"])
+def prefilter(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(fuzzy_match, "rapid_process", None)
+    elif fuzzy_match.rapid_process is None:
+        pytest.skip("rapidfuzz is not installed")
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_extract_one_matches_fuzzywuzzy_extract_one(prefilter, query):
+    matcher = FuzzyMatcher(TRANSPORT_OPTIONS, processor=default_process)
+    old = process.extractOne(query, TRANSPORT_OPTIONS, scorer=fuzz.partial_ratio)
+    expected = (old[0], old[1]) if old and old[1] > 70 else None
+    match = matcher.extract_one(query, threshold=70)
+    assert (match[:2] if match else None) == expected
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_above_cutoff_match_partial_ratio(prefilter, query):
+    matcher = FuzzyMatcher(CELLS)
+    scores = matcher.scores(query, cutoff=70)
+    for cell, score in zip(CELLS, scores):
+        expected = fuzz.partial_ratio(query, cell)
+        if expected > 70:
+            assert score == expected
+        else:
+            assert score <= 70
+
+
+def test_extract_orders_best_first_and_keeps_ties_in_choice_order():
+    matcher = FuzzyMatcher(["car rental", "rental", "car"])
+    matches = matcher.extract("car", threshold=70)
+    assert [choice for choice, _, _ in matches] == ["car rental", "car"]
+    assert [position for _, _, position in matches] == [0, 2]
+
+
+def test_empty_query_and_choices():
+    assert FuzzyMatcher(TRANSPORT_OPTIONS, processor=default_process).extract_one("!!!") is None
+    assert FuzzyMatcher([]).extract("bus") == []
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from intent_router import INTENT_TABLE, IntentRouter
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter(INTENT_TABLE + [("dubai", "airport", "Dubai"), ("dxb", "airport", "Dubai"),
+                                        ("bangalore", "airport", "Bangalore"), ("kempegowda", "airport", "Bangalore")])
+
+
+@pytest.mark.parametrize("message", ["i know", "north terminal", "nothing", "nobody", "kno w"])
+def test_no_only_matches_as_a_whole_word(router, message):
+    assert "decline" not in router.match(message)
+
+
+@pytest.mark.parametrize("message", ["no", "No thanks", "no.", "well, no!"])
+def test_no_declines(router, message):
+    assert router.match(message)["decline"] is True
+
+
+def test_phrases_match_all_their_words(router):
+    assert router.match("thank you so much") == {"thanks": True}
+    assert router.match("thank goodness") == {}
+    assert router.match("you thank") == {}
+
+
+def test_the_first_phrase_in_the_message_wins_within_an_intent(router):
+    assert router.match("visa or transport")["category"] == "visa"
+    assert router.match("transport or visa")["category"] == "transport"
+    assert router.match("dxb not bangalore")["airport"] == "Dubai"
+    assert router.match("kempegowda facilities") == {"airport": "Bangalore", "category": "facilities"}
+
+
+def test_every_intent_in_the_message_is_reported(router):
+    assert router.match("thanks, bye") == {"thanks": True, "goodbye": True}
+    assert router.match("DUBAI Visa") == {"airport": "Dubai", "category": "visa"}
+
+
+def test_query_checks_goodbye_before_thanks_and_airports(client):
+    user_id = uuid.uuid4().hex
+
+    def query(message):
+        return client.post("/query", json={"user_id": user_id, "message": message}).get_json()["response"]
+
+    assert query("thanks, bye") == "Goodbye! Have a great day!"
+    assert query("thanks dubai").startswith("You're welcome")
+    assert query("I know about Dubai") == "You selected Dubai Airport. Choose an option:"
@@ -0,0 +1,80 @@
+import json
+import math
+
+import pytest
+
+from itinerary_risk import duration_minutes, score_itineraries, segment_times
+
+
+def segment(departure, arrival):
+    return {"departure": {"iataCode": "AAA", "at": departure}, "arrival": {"iataCode": "BBB", "at": arrival}}
+
+
+def test_ranks_safe_itineraries_before_risky_connections():
+    itineraries = [
+        {
+            "id": "tight",
+            "duration": "PT6H",
+            "segments": [segment("2026-11-01T08:00:00", "2026-11-01T10:00:00"),
+                         segment("2026-11-01T10:45:00", "2026-11-01T14:00:00")],
+            "predictions": [{"probability": "0.22"}, {"probability": "0.1"}]
+        },
+        {
+            "id": "direct",
+            "segments": [segment("2026-11-01T08:00:00", "2026-11-01T16:00:00")],
+            "predictions": [{"predictionUnavailable": True}]
+        }
+    ]
+    results = score_itineraries(itineraries)
+    assert [r["id"] for r in results] == ["direct", "tight"]
+    direct, tight = results
+    assert direct["duration"] == 480.0 and direct["min_layover"] is None
+    assert tight["layovers"] == [45.0]
+    assert tight["predicted_delays"] == [60, 0]
+    assert tight["at_risk"] and tight["risk"] == 1.0
+    assert tight["duration"] == 360.0
+
+
+def test_mixed_offsets_are_compared_in_utc():
+    # The second leg leaves at 12:00+02:00, i.e. 10:00 UTC: a one hour layover
+    itineraries = [{
+        "segments": [segment("2026-11-01T08:00:00Z", "2026-11-01T09:00:00"),
+                     segment("2026-11-01T12:00:00+02:00", "2026-11-01T15:00:00+02:00")]
+    }]
+    [result] = score_itineraries(itineraries)
+    assert result["layovers"] == [60.0]
+    assert result["duration"] == 300.0
+
+
+@pytest.mark.parametrize("at", [None, "", "tomorrow", 1700000000])
+def test_invalid_segment_times_are_rejected(at):
+    itineraries = [{"segments": [segment(at, "2026-11-01T10:00:00")]}]
+    with pytest.raises(ValueError):
+        score_itineraries(itineraries)
+
+
+@pytest.mark.parametrize("duration", [5, 5.0, "5", "2 hours", "P", True])
+def test_non_iso_durations_are_rejected(duration):
+    itineraries = [{"duration": duration, "segments": [segment("2026-11-01T08:00:00", "2026-11-01T10:00:00")]}]
+    with pytest.raises(ValueError):
+        score_itineraries(itineraries)
+
+
+def test_helpers():
+    assert list(duration_minutes(["PT2H35M", "P1DT1M"])) == [155.0, 1441.0]
+    assert math.isnan(duration_minutes([None])[0])
+    assert segment_times(["2026-11-01T10:00:00+01:00"])[0] == segment_times(["2026-11-01T09:00:00"])[0]
+
+
+def test_route_answers_400_for_bad_input_and_valid_json_otherwise(client):
+    bad = {"itineraries": [{"segments": [segment("2026-11-01T08:00:00", None)]}]}
+    response = client.post("/itineraries/risk", json=bad)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid segment time"}
+
+    good = {"itineraries": [{"segments": [segment("2026-11-01T08:00:00", "2026-11-01T10:00:00+00:00")]}]}
+    response = client.post("/itineraries/risk", json=good)
+    assert response.status_code == 200
+    # Strict parsing: NaN or Infinity would not be valid JSON
+    body = json.loads(response.get_data(as_text=True), parse_constant=lambda c: pytest.fail(c))
+    assert body["results"][0]["duration"] == 120.0
@@ -0,0 +1,42 @@
+import base64
+import json
+
+import pytest
+
+from list_cursor import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("listing", [
+    ("f40ac11cf535a2c7", "Bangalore", "transport", "bus", 50),
+    ("v2", "Dubai", "facilities", "café & spa / lounge?", 0),
+    ("v3", "Dubai", "transport", "from:airport to:yelahanka", 12345)
+])
+def test_round_trip(listing):
+    cursor = encode_cursor(*listing)
+    assert cursor.isascii() and "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor) == listing
+
+
+def raw(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "@@garbage",
+    "not base64!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+    raw({"version": "v1"}),
+    raw(["v1", "Dubai", "transport", "bus"]),
+    raw(["v1", "Dubai", "transport", "bus", 1, 2]),
+    raw(["v1", "Dubai", "transport", "bus", -1]),
+    raw(["v1", "Dubai", "transport", "bus", 1.5]),
+    raw(["v1", "Dubai", "transport", "bus", True]),
+    raw(["v1", None, "transport", "bus", 0]),
+    raw(12),
+    12,
+    None
+])
+def test_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,54 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_up_to_capacity_then_refill_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.25
+    assert not bucket.try_acquire()
+    clock.now += 0.25
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_refill_stops_at_capacity(clock):
+    bucket = TokenBucket(rate=5, capacity=2)
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_wait_reported_until_next_token(clock):
+    bucket = TokenBucket(rate=4, capacity=1)
+    assert bucket._take() == 0
+    assert bucket._take() == pytest.approx(0.25)
+    clock.now += 0.1
+    assert bucket._take() == pytest.approx(0.15)
+
+
+def test_acquire_gives_up_when_timeout_is_shorter_than_the_wait(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.5)
+
+
+def test_default_capacity():
+    assert TokenBucket(rate=0.5).capacity == 1.0
+    assert TokenBucket(rate=10).capacity == 10
@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def history(backend):
+    return backend.ReplyHistory(3)
+
+
+def test_ring_buffer_keeps_the_newest_items(history):
+    assert history.extend(["a", "b"]) == 2
+    assert history.extend(["c", "d", "e"]) == 5
+    assert [reply for _, reply in history.items] == ["c", "d", "e"]
+    assert history.page() == (["c", "d", "e"], None)
+
+
+def test_pages_walk_back_until_the_oldest_kept_item(history):
+    history.extend(["a", "b", "c", "d", "e"])
+    assert history.page(limit=2) == (["d", "e"], 3)
+    # Items older than the buffer are gone, so there is no further page
+    assert history.page(before=3, limit=2) == (["c"], None)
+    assert history.page(before=2) == ([], None)
+    assert history.page(limit=0) == ([], None)
+
+
+def test_history_route_pages_through_earlier_replies(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, "REPLY_HISTORY_SIZE", 4)
+    user_id = uuid.uuid4().hex
+
+    def query(message):
+        return client.post("/query", json={"user_id": user_id, "message": message}).get_json()
+
+    query("Dubai")
+    query("facilities")
+    first = query("lounge")
+    second = query("restaurant")
+    cursor = second["history_cursor"]
+    assert cursor == len(first["response"]) + len(second["response"])
+
+    replies = (first["response"] + second["response"])[-4:]
+    page = client.get("/history", query_string={"user_id": user_id, "limit": 3}).get_json()
+    assert page == {"items": replies[1:], "next_before": cursor - 3}
+    older = client.get("/history", query_string={"user_id": user_id, "before": page["next_before"]}).get_json()
+    assert older == {"items": replies[:1], "next_before": None}
+    # The limit is capped at the buffer size
+    assert client.get("/history", query_string={"user_id": user_id, "limit": 100}).get_json()["items"] == replies
+
+
+def test_history_of_an_unknown_session_is_empty(client):
+    response = client.get("/history", query_string={"user_id": uuid.uuid4().hex})
+    assert response.get_json() == {"items": [], "next_before": None}
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.current = datetime(2026, 1, 1, 12, 0)
+
+    def now(self):
+        return self.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, "datetime", clock)
+    return clock
+
+
+def test_cap_evicts_the_least_recently_active_session(clock):
+    store = SessionStore(timedelta(hours=1), max_sessions=2)
+    store.touch("a")
+    store.touch("b")
+    store.touch("a")  # b is now the least recently active
+    store.touch("c")
+    assert "a" in store and "c" in store and "b" not in store
+    assert len(store) == 2
+    assert (store.created, store.evicted) == (3, 1)
+
+
+def test_touch_keeps_state_and_creates_from_the_factory(clock):
+    store = SessionStore(timedelta(hours=1), max_sessions=10, factory=lambda: {"replies": []})
+    store.touch("a")["airport"] = "Dubai"
+    state = store.touch("a")
+    assert state["airport"] == "Dubai" and state["replies"] == []
+    assert store.created == 1
+
+
+def test_expire_removes_only_idle_sessions(clock):
+    store = SessionStore(timedelta(minutes=30), max_sessions=10)
+    store.touch("a")
+    clock.current += timedelta(minutes=20)
+    store.touch("b")
+    store.touch("c")
+    clock.current += timedelta(minutes=15)
+    store.touch("b")  # Activity keeps a session alive
+    assert store.expire() == ["a"]
+    clock.current += timedelta(minutes=20)
+    assert store.expire() == ["c"]
+    assert "b" in store and len(store) == 1
+    assert store.expired == 2
+
+
+def test_a_session_idle_for_exactly_the_timeout_is_kept(clock):
+    store = SessionStore(timedelta(minutes=30), max_sessions=10)
+    store.touch("a")
+    clock.current += timedelta(minutes=30)
+    assert store.expire() == []
+    clock.current += timedelta(microseconds=1)
+    assert store.expire() == ["a"]
+
+
+def test_ending_a_session(clock):
+    store = SessionStore(timedelta(hours=1), max_sessions=10)
+    store.touch("a")
+    del store["a"]
+    assert "a" not in store and store.ended == 1
+    with pytest.raises(KeyError):
+        store["a"]
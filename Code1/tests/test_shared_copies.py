@@ -0,0 +1,12 @@
+import filecmp
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# The chatbot app keeps its own copies of these; they must not drift apart
+@pytest.mark.parametrize("name", ["fuzzy_match.py", "log_pipeline.py", "transport_index.py", "train_network.py", "workbook.py", "country_registry.py", "session_store.py", "intent_router.py", "airport_registry.py", "countries.json", "airports.json"])
+def test_chatbot_copy_matches(name):
+    assert filecmp.cmp(os.path.join(ROOT, "Code1", name), os.path.join(ROOT, "chatbot", name), shallow=False)
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from train_network import TrainNetwork, to_minutes
+from workbook import clean_record
+
+TRAINS = [
+    # Train no., Departure, Departure time, Halt, Arrival, Arrival Time
+    (101, "KSR-Majestic", "08:00:00", "Cantonment, Yelahanka", "Airport", "09:00:00"),
+    (102, "Airport", "10:00:00", "No stops", "Devanahalli", "10:30:00"),
+    (103, "Yelahanka", "08:10:00", "none", "Airport", "08:40:00"),
+    (104, "Mysore", "06:00:00", "Mandya", "KSR-Majestic", "07:30:00"),
+    (105, "Hosur", "09:00:00", None, "Cantonment", "09:30:00"),
+    (106, "Mandya", "07:00:00", None, "Airport", "08:30:00"),
+]
+
+
+@pytest.fixture(scope="module")
+def network():
+    df = pd.DataFrame(TRAINS, columns=["Train no.", "Departure", "Departure time", "Halt", "Arrival", "Arrival Time"])
+    return TrainNetwork(df, [clean_record(row) for row in df.to_dict(orient="records")])
+
+
+def test_stations_skip_placeholder_halts(network):
+    assert network.stations == ["Airport", "Cantonment", "Devanahalli", "Hosur", "Ksr-Majestic", "Mandya", "Mysore", "Yelahanka"]
+    assert network.stops[0] == ["ksr-majestic", "cantonment", "yelahanka", "airport"]
+
+
+def test_resolve_prefers_an_exact_station(network):
+    assert network.resolve(" Airport ") == ["airport"]
+    assert network.resolve("majestic") == ["ksr-majestic"]
+    assert network.resolve("") == []
+
+
+def test_direct_trains_call_at_both_stations_in_order(network):
+    assert network.direct_trains(["ksr-majestic"], ["airport"]) == [0]
+    assert network.direct_trains(["yelahanka"], ["airport"]) == [0, 2]
+    assert network.direct_trains(["airport"], ["ksr-majestic"]) == []
+
+
+def test_connections_rank_one_change_journeys_by_arrival(network):
+    # Via Mandya arrives 08:30, via KSR-Majestic 09:00
+    assert network.connections(["mysore"], ["airport"]) == [(3, "mandya", 5), (3, "ksr-majestic", 0)]
+    assert network.connections(["mysore"], ["airport"], limit=1) == [(3, "mandya", 5)]
+
+
+def test_connections_need_the_second_train_to_leave_after_the_first_arrives(network):
+    # Train 101 has left Cantonment (about 08:20) before 105 gets there at 09:30
+    assert network.connections(["hosur"], ["airport"]) == []
+    # A journey needing two changes is not offered
+    assert network.connections(["mysore"], ["devanahalli"]) == []
+
+
+def test_describe_connection_names_both_legs(network):
+    journey = network.connections(["mysore"], ["airport"])[0]
+    assert network.describe_connection(journey, ["mysore"], ["airport"]) == {
+        "Journey": "Mysore to Airport with a change at Mandya",
+        "First train": "Train 104: Mysore (06:00:00) to Mandya",
+        "Change at": "Mandya",
+        "Second train": "Train 106: Mandya (07:00:00) to Airport (08:30:00)"
+    }
+
+
+def test_to_minutes():
+    assert to_minutes("08:30:00") == 510
+    assert to_minutes("8:30") == 510
+    assert to_minutes("late") is None
+    assert to_minutes(None) is None
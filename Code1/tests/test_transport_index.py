@@ -0,0 +1,41 @@
+import random
+import string
+
+import pytest
+
+from transport_index import TransportSearchIndex
+
+
+@pytest.fixture(scope="module")
+def records():
+    rng = random.Random(3)
+    alphabet = string.ascii_letters + string.digits + " :-"
+    return [
+        {f"col{c}": "".join(rng.choices(alphabet, k=rng.randint(1, 12))) for c in range(rng.randint(1, 4))}
+        for _ in range(300)
+    ] + [{"Route": "KIA-8", "Fare": 250, "Departs": "08:30:00"}]
+
+
+def substring_scan(records, message):
+    message = message.lower()
+    return [i for i, record in enumerate(records) if any(message in str(value).lower() for value in record.values())]
+
+
+def test_search_equals_a_substring_scan(records):
+    index = TransportSearchIndex(records)
+    rng = random.Random(5)
+    queries = ["", "a", "A", "ab", "kia", "8:3", "250", " ", "zzzzzz", "kia-8"]
+    # Substrings of real cells, so most queries have hits, plus random misses
+    for _ in range(300):
+        cell = str(rng.choice(list(rng.choice(records).values())))
+        start = rng.randrange(len(cell))
+        queries.append(cell[start:start + rng.randint(1, 6)])
+        queries.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 5))))
+    for message in queries:
+        assert index.search(message) == substring_scan(records, message), message
+
+
+def test_fragments_stay_aligned_with_records():
+    index = TransportSearchIndex(iter([{"a": "bus"}, {"a": "taxi"}]), iter([b"0", b"1"]))
+    assert [index.fragments[i] for i in index.search("taxi")] == [b"1"]
+    assert TransportSearchIndex([{"a": "bus"}]).fragments is None
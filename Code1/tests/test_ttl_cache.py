@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(ttl=10, max_entries=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    clock.now += 20
+    assert cache.get("b", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_expired_entry_is_loaded_again(clock):
+    cache = TTLCache(ttl=5, max_entries=10)
+    values = iter([1, 2])
+    assert cache.get_or_load("k", lambda: next(values)) == 1
+    assert cache.get_or_load("k", lambda: next(values)) == 1
+    clock.now += 5
+    assert cache.get_or_load("k", lambda: next(values)) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_concurrent_misses_run_the_loader_once():
+    cache = TTLCache(ttl=60, max_entries=10)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+    assert (cache.misses, cache.coalesced) == (1, 7)
+
+
+@pytest.mark.parametrize("error", [ValueError("upstream failed"), KeyboardInterrupt()])
+def test_loader_failure_reaches_every_waiter_and_is_not_cached(error):
+    cache = TTLCache(ttl=60, max_entries=10)
+    started = threading.Event()
+    release = threading.Event()
+
+    def loader():
+        started.set()
+        release.wait(5)
+        raise error
+
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(cache.get_or_load("k", loader))
+        except BaseException as e:
+            outcomes.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=call) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    while cache.coalesced < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join()
+    assert outcomes == [error] * 4
+    assert cache.get_or_load("k", lambda: "retry") == "retry"
+
+
+def test_async_concurrent_misses_run_the_loader_once():
+    cache = TTLCache(ttl=60, max_entries=10)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_load_async("k", loader) for _ in range(8)])
+
+    assert asyncio.run(main()) == ["value"] * 8
+    assert len(calls) == 1
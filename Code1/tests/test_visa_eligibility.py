@@ -0,0 +1,41 @@
+import pytest
+
+
+def eligibility(client, payload):
+    return client.post("/visa/eligibility", json=payload)
+
+
+def test_every_airport_is_checked_when_none_are_given(client):
+    response = eligibility(client, {"countries": ["india"]})
+    assert response.status_code == 200
+    [result] = response.get_json()["results"]
+    assert result["country"] == "India"
+    assert set(result["eligibility"]) == {"Bangalore", "Dubai"}
+
+
+def test_airport_names_are_matched_case_insensitively(client):
+    response = eligibility(client, {"countries": ["India", "Atlantis"], "airports": ["dubai"]})
+    assert response.status_code == 200
+    found, unknown = response.get_json()["results"]
+    assert list(found["eligibility"]) == ["Dubai"]
+    assert unknown == {"input": "Atlantis", "country": None, "error": "Unrecognized country"}
+
+
+@pytest.mark.parametrize("payload, error", [
+    ({}, "Missing countries"),
+    ({"countries": "India"}, "Missing countries"),
+    ({"countries": ["India"], "airports": "Dubai"}, "Airports must be a list of airport names"),
+    ({"countries": ["India"], "airports": ["Dubai", 7]}, "Airports must be a list of airport names"),
+    ({"countries": ["India"], "airports": {"Dubai": True}}, "Airports must be a list of airport names"),
+    ({"countries": ["India"], "airports": ["Dubai", "Gotham"]}, "Unknown airports: Gotham"),
+])
+def test_invalid_requests_are_rejected(client, payload, error):
+    response = eligibility(client, payload)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+def test_non_object_bodies_are_rejected(client):
+    response = client.post("/visa/eligibility", json=["India"])
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Missing countries"}
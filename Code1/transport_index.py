@@ -0,0 +1,44 @@
+# Inverted index over every cell of an airport's transport sheets, used by the
+# free-text fallback search. Each character n-gram (lengths 1 to NGRAM_SIZE) of
+# a cell maps to the set of rows containing it, so a query only has to verify
+# the rows in the intersection of its own n-gram posting sets.
+#
+# Records are the cleaned rows of all sheets in order; fragments, when given,
+# are their pre-encoded JSON, kept alongside so results can be served as is.
+class TransportSearchIndex:
+    NGRAM_SIZE = 3
+
+    def __init__(self, records, fragments=None):
+        self.records = list(records)
+        self.fragments = None if fragments is None else list(fragments)
+        self.cells = []
+        self.postings = {}
+        for row_id, record in enumerate(self.records):
+            cells = [str(value).lower() for value in record.values()]
+            self.cells.append(cells)
+            for cell in cells:
+                for gram in self._ngrams(cell):
+                    self.postings.setdefault(gram, set()).add(row_id)
+
+    @classmethod
+    def _ngrams(cls, text):
+        return {text[i:i + n] for n in range(1, cls.NGRAM_SIZE + 1) for i in range(len(text) - n + 1)}
+
+    def search(self, message):
+        """Return the ids (in sheet order) of the records with a cell containing message."""
+        message = message.lower()
+        if not message:
+            return list(range(len(self.records)))
+        n = min(len(message), self.NGRAM_SIZE)
+        grams = {message[i:i + n] for i in range(len(message) - n + 1)}
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            rows = self.postings.get(gram)
+            if not rows:
+                return []
+            candidates = set(rows) if candidates is None else candidates & rows
+            if not candidates:
+                return []
+        # n-grams only narrow the candidates down; confirm the full substring
+        return [row_id for row_id in sorted(candidates)
+                if any(message in cell for cell in self.cells[row_id])]
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Thread-safe LRU cache whose entries expire after a TTL. get_or_load() runs
+# the loader at most once per key at a time: concurrent callers asking for a
+# missing key wait for the first caller's result instead of repeating the
+# upstream call (singleflight). Values are stored as given, so callers can
+# cache encoded bytes and return them without re-serializing.
+class TTLCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Misses served by another caller's in-flight load
+        self._entries = OrderedDict()  # Key -> (value, monotonic expiry time)
+        self._flights = {}
+        self._async_flights = {}  # Key -> asyncio.Future of the loading coroutine
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, now):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value for key, calling loader() once across threads on a miss."""
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            # Every failure, KeyboardInterrupt and SystemExit included, reaches
+            # the waiters; none of them may mistake it for a None value
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def get_or_load_async(self, key, loader, ttl=None):
+        """Like get_or_load(), for a coroutine loader; waiting callers are coroutines on the same loop."""
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            flight = self._async_flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Shielded so one waiter going away does not cancel the shared result
+            return await asyncio.shield(flight)
+
+        try:
+            value = await loader()
+            self.set(key, value, ttl)
+            flight.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, Exception):
+                flight.set_exception(e)
+                flight.exception()  # Nobody may be waiting; mark the error as retrieved
+            else:
+                flight.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,89 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+# Only the async serving mode needs httpx
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+CURRENT_WEATHER_PATH = "/weather"
+
+
+def _current_params(api_key, lat, lon):
+    return {"lat": lat, "lon": lon, "units": "metric", "appid": api_key}
+
+
+class WeatherError(Exception):
+    """Raised when the OpenWeatherMap API answers with a non-2xx status."""
+
+    def __init__(self, status_code, message=None):
+        self.status_code = status_code
+        super().__init__(message or f"Weather API error: {status_code}")
+
+
+# Outbound client for OpenWeatherMap shared by every request of the process,
+# with one pooled session so repeated lookups reuse open connections
+class WeatherClient:
+    def __init__(self, api_endpoint="https://api.openweathermap.org/data/2.5",
+                 connect_timeout=3.05, read_timeout=5, pool_size=20):
+        self.api_endpoint = api_endpoint.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def current(self, api_key, lat, lon):
+        """Return the raw current-weather payload for a coordinate."""
+        response = self.session.get(
+            f"{self.api_endpoint}{CURRENT_WEATHER_PATH}",
+            params=_current_params(api_key, lat, lon),
+            timeout=self.timeout
+        )
+        if not response.ok:
+            raise WeatherError(response.status_code)
+        return response.json()
+
+
+# Non-blocking counterpart of WeatherClient for the async serving mode, over
+# one pooled httpx.AsyncClient
+class AsyncWeatherClient:
+    def __init__(self, api_endpoint="https://api.openweathermap.org/data/2.5",
+                 connect_timeout=3.05, read_timeout=5, pool_size=100):
+        if httpx is None:
+            raise RuntimeError("The async serving mode requires httpx")
+        self.api_endpoint = api_endpoint.rstrip("/")
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def current(self, api_key, lat, lon):
+        response = await self.client.get(f"{self.api_endpoint}{CURRENT_WEATHER_PATH}", params=_current_params(api_key, lat, lon))
+        if not response.is_success:
+            raise WeatherError(response.status_code)
+        return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def format_weather(weather, coordinates, iata_code):
+    """Reduce an OpenWeatherMap payload to the fields the results page shows."""
+    return {
+        "location": coordinates.get("name") or f"{iata_code} Airport",
+        "city": coordinates.get("city", ""),
+        "temperature": round(weather["main"]["temp"]),
+        "feels_like": round(weather["main"]["feels_like"]),
+        "description": weather["weather"][0]["description"],
+        "icon": weather["weather"][0]["icon"],
+        "humidity": weather["main"]["humidity"],
+        "wind_speed": weather["wind"]["speed"],
+        "pressure": weather["main"]["pressure"],
+        "visibility": weather.get("visibility", 0) / 1000,  # Convert to km
+        # Epoch seconds; the page formats them in the viewer's locale
+        "timestamp": weather["dt"],
+        "sunrise": weather["sys"]["sunrise"],
+        "sunset": weather["sys"]["sunset"]
+    }
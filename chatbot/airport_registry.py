@@ -0,0 +1,40 @@
+import hashlib
+import json
+
+
+# Airports the chatbot knows about, read from the JSON manifest instead of
+# being spelled out in code. Each entry maps an airport to the workbook sheets
+# behind its facilities, transport options and visa lists, plus the extra
+# words users may type to pick it, so onboarding an airport is a manifest edit.
+class AirportRegistry:
+    CATEGORIES = [("transport", "Transport"), ("facilities", "Facilities"), ("visa", "Visa")]
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.digest = hashlib.sha256(raw).hexdigest()[:16]
+        self.airports = json.loads(raw)["airports"]
+        for name, entry in self.airports.items():
+            if not isinstance(entry.get("sheets"), dict):
+                raise ValueError(f"Airport '{name}' in {path} has no sheets")
+        self.names = list(self.airports)
+
+    def __contains__(self, name):
+        return name in self.airports
+
+    def layout(self, name):
+        return self.airports[name]["sheets"]
+
+    def intents(self):
+        """Intent table rows selecting each airport by its name or an alias."""
+        return [(phrase.lower(), "airport", name)
+                for name, entry in self.airports.items()
+                for phrase in [name, *entry.get("aliases", [])]]
+
+    def categories(self, name):
+        """Buttons for the categories this airport has data for."""
+        layout = self.layout(name)
+        return [label for key, label in self.CATEGORIES if key in layout]
+
+    def transport_options(self, name):
+        return list(self.layout(name).get("transport", {}))
@@ -0,0 +1,21 @@
+# Async serving mode for the chatbot backend:
+#
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+#
+# The event loop accepts and holds connections; /query itself is the
+# unchanged Flask view, run in a bounded thread pool (ASGI_WSGI_WORKERS) since
+# its matching and scoring is CPU-bound. Thousands of idle or slow clients
+# therefore cost sockets, not threads, and the JSON contract is unchanged.
+import os
+
+from a2wsgi import WSGIMiddleware
+
+import backend
+
+WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "8"))
+
+app = WSGIMiddleware(backend.app, workers=WSGI_WORKERS)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("asgi:app", host="0.0.0.0", port=5000)
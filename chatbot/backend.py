@@ -1,134 +1,262 @@
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import os
 import logging
-from datetime import datetime, timedelta
-from fuzzywuzzy import fuzz, process
-import requests  # Add this import for making API requests
+import threading
+from collections.abc import Mapping
+from collections import OrderedDict
+from datetime import timedelta
+from log_pipeline import configure_logging, init_request_ids, parse_sample_rates
+from fuzzy_match import FuzzyMatcher, default_process
+from workbook import LazyDict, WorkbookSnapshot, clean_record, load_sheets
+from airport_registry import AirportRegistry
+from session_store import SessionStore
+from intent_router import INTENT_TABLE, IntentRouter
+from country_registry import GCC_EXEMPT, NOT_ELIGIBLE, VISA_ON_ARRIVAL, CountryRegistry, build_visa_eligibility
+from transport_index import TransportSearchIndex
+from train_network import TrainNetwork
 
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
-# Load Excel file once
-DATA_FILE = "Airport details.xlsx"
-DATA = pd.ExcelFile(DATA_FILE)
-
-# Now define SHEETS with the specially handled DataFrame
-SHEETS = {
-    "Bangalore": {
-        "facilities": DATA.parse("Bangalore airport facilities"),
-        "transport": {
-            "bus": DATA.parse("Bangalore bus"),
-            "car rental": DATA.parse("Bangalore car rental"),  # Use our specially handled DataFrame
-            "taxis": DATA.parse("Bangalore taxis"),
-            "train": DATA.parse("Bangalore Train"),
-            "services": DATA.parse("Bangalore Transport service")
-        },
-        "visa": DATA.parse("Visa on Arrival Bangalore")
-    },
-    "Dubai": {
-        "facilities": DATA.parse("Dubai Airport facilities"),
-        "transport": {
-            "metro": DATA.parse("Dubai metro"),
-            "car rental": DATA.parse("Dubai car rental"),
-            "services": DATA.parse("Dubai Transport services")
-        },
-        "visa": DATA.parse("Visa on Arrival Dubai"),
-        "GCC": DATA.parse("GCC")
-    }
-}
-
-USER_STATE = {}
+# Configure logging. Records are written by a background thread, and DEBUG
+# records of the per-request loggers below are sampled; LOG_SAMPLE takes
+# "logger=rate" pairs, e.g. "backend.query=1" to see every query again.
+DEFAULT_LOG_SAMPLE = "backend.query=0.05,backend.sessions=0.05"
+LOG_HANDLER = configure_logging(
+    level=os.environ.get("LOG_LEVEL", "DEBUG"),
+    fmt=os.environ.get("LOG_FORMAT", "text"),
+    sample_rates=parse_sample_rates(os.environ.get("LOG_SAMPLE", DEFAULT_LOG_SAMPLE)),
+    queue_size=int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+)
+init_request_ids(app)
+QUERY_LOG = logging.getLogger("backend.query")
+SESSION_LOG = logging.getLogger("backend.sessions")
+
+# Location of the workbook holding all airport data, resolved next to this
+# file so the server can be started from any working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.environ.get("AIRPORT_DATA_FILE", os.path.join(BASE_DIR, "Airport details.xlsx"))
+SNAPSHOT_DIR = os.environ.get("AIRPORT_SNAPSHOT_DIR", os.path.join(BASE_DIR, ".snapshots"))
+
+# Manifest of supported airports and the workbook sheets behind each one
+MANIFEST_FILE = os.environ.get("AIRPORT_MANIFEST", os.path.join(BASE_DIR, "airports.json"))
+# Approximate memory allowed for loaded airports before the coldest are dropped
+AIRPORT_MEMORY_BUDGET = int(float(os.environ.get("AIRPORT_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+
+# Parquet snapshot of the workbook, built on the first start after it changes
+SNAPSHOT = WorkbookSnapshot(DATA_FILE, SNAPSHOT_DIR)
+
+# Lowercased Type and Name cells of a facilities sheet. A row matches a query
+# when either cell scores above 70 against it or contains it, as before, but
+# all cells are scored in one batched call instead of row by row.
+class FacilityMatcher:
+    COLUMNS = ["Type", "Name"]
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.cells = [df[col].map(str).str.lower() for col in self.COLUMNS if col in df.columns]
+        self.matcher = FuzzyMatcher([cell for cells in self.cells for cell in cells])
+
+    def match(self, message):
+        """Return a boolean mask of the rows matching message."""
+        if not self.cells:
+            return np.zeros(self.size, dtype=bool)
+        scores = self.matcher.scores(message, cutoff=70).reshape(len(self.cells), self.size)
+        mask = (scores > 70).any(axis=0)
+        for cells in self.cells:
+            mask |= cells.str.contains(message, regex=False).to_numpy(dtype=bool)
+        return mask
+
+# Rough in-memory size of a loaded sheet or index, for the airport memory
+# budget. Only needs to rank airports against each other, not be exact.
+def approx_nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, TransportSearchIndex):
+        return 300 * len(value.records) + 100 * len(value.postings) + 40 * sum(map(len, value.postings.values()))
+    if isinstance(value, FacilityMatcher):
+        return 100 * len(value.matcher.keys)
+    if isinstance(value, FuzzyMatcher):
+        return 100 * len(value.keys)
+    if isinstance(value, TrainNetwork):
+        return 200 * (sum(map(len, value.stops)) + len(value.names))
+    if isinstance(value, dict):
+        return 100 * len(value)
+    return 0
+
+# Free-text index over the cleaned rows of all transport sheets
+def build_transport_index(city_data):
+    return TransportSearchIndex(clean_record(row) for df in city_data.values() for row in df.to_dict(orient="records"))
+
+def build_train_network(city_data):
+    key = next((k for k in city_data.keys() if "train" in k.lower()), None)
+    if key is None:
+        return None
+    train_data = city_data[key]
+    return TrainNetwork(train_data, [clean_record(row) for row in train_data.to_dict(orient="records")])
+
+# One airport's sheets and the search indexes over them, read and built on first use
+class AirportData:
+    def __init__(self, snapshot, name, layout):
+        self.name = name
+        self.sheets = load_sheets(snapshot, layout)
+        self._indexes = LazyDict({
+            "transport": lambda: build_transport_index(self.sheets["transport"]),
+            "transport_options": lambda: FuzzyMatcher(self.sheets["transport"].keys(), processor=default_process),
+            "train": lambda: build_train_network(self.sheets["transport"]),
+            "facilities": lambda: FacilityMatcher(self.sheets["facilities"]),
+            "visa": lambda: build_visa_eligibility(COUNTRIES, self.sheets)
+        })
+        self._sizes = {}  # Path of a loaded value -> approx_nbytes
+
+    @property
+    def transport_index(self):
+        return self._indexes["transport"]
+
+    @property
+    def transport_matcher(self):
+        return self._indexes["transport_options"]
+
+    @property
+    def train_network(self):
+        return self._indexes["train"]
+
+    @property
+    def facility_matcher(self):
+        return self._indexes["facilities"]
+
+    @property
+    def visa_eligibility(self):
+        return self._indexes["visa"]
+
+    def _loaded(self, values, path):
+        for key, value in values.loaded().items():
+            if isinstance(value, LazyDict):
+                yield from self._loaded(value, path + (key,))
+            else:
+                yield path + (key,), value
+
+    def nbytes(self):
+        """Approximate memory held by the parts loaded so far."""
+        total = 0
+        for path, value in [*self._loaded(self.sheets, ("sheets",)), *self._loaded(self._indexes, ("indexes",))]:
+            if path not in self._sizes:
+                self._sizes[path] = approx_nbytes(value)
+            total += self._sizes[path]
+        return total
+
+# Loaded airports in least recently used order, bounded by an approximate
+# memory budget. An airport is loaded on first use; once the loaded airports
+# together exceed the budget the coldest ones are dropped. A request still
+# holding a dropped airport keeps using it, and the next request for that
+# airport loads it again from the snapshot.
+class AirportCache(Mapping):
+    def __init__(self, snapshot, registry, budget):
+        self.snapshot = snapshot
+        self.registry = registry
+        self.budget = budget
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        layout = self.registry.layout(name)
+        with self._lock:
+            airport = self._resident.get(name)
+            if airport is None:
+                airport = self._resident[name] = AirportData(self.snapshot, name, layout)
+            self._resident.move_to_end(name)
+            self._evict()
+        return airport
+
+    def _evict(self):
+        # Caller holds the lock; the airport just requested is never dropped
+        total = sum(airport.nbytes() for airport in self._resident.values())
+        while total > self.budget and len(self._resident) > 1:
+            name, airport = self._resident.popitem(last=False)
+            total -= airport.nbytes()
+            logging.debug(f"Unloaded airport {name} to stay within the memory budget")
+
+    def __iter__(self):
+        return iter(self.registry.names)
+
+    def __len__(self):
+        return len(self.registry.names)
+
+REGISTRY = AirportRegistry(MANIFEST_FILE)
+AIRPORTS = AirportCache(SNAPSHOT, REGISTRY, AIRPORT_MEMORY_BUDGET)
+
 SESSION_TIMEOUT = timedelta(hours=1)  # Define session timeout duration
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "50000"))  # Hard cap, least recently active evicted first
+USER_STATE = SessionStore(SESSION_TIMEOUT, MAX_SESSIONS, factory=dict)
+
+# Bundled country registry used to validate visa queries
+COUNTRIES = CountryRegistry(os.path.join(BASE_DIR, "countries.json"))
 
-# Cache for storing the list of valid countries
-VALID_COUNTRIES_CACHE = []
+# Intent router over the shared keyword table and this manifest's airports
+INTENT_ROUTER = IntentRouter(INTENT_TABLE + REGISTRY.intents())
 
 # Utility function to clean up old sessions
 def cleanup_sessions():
-    now = datetime.now()
-    expired_users = [user_id for user_id, state in USER_STATE.items() if state.get("last_active", now) < now - SESSION_TIMEOUT]
-    for user_id in expired_users:
-        del USER_STATE[user_id]
-        logging.debug(f"Cleaned up session for user: {user_id}")
-
-def fetch_valid_countries():
-    global VALID_COUNTRIES_CACHE
-    if not VALID_COUNTRIES_CACHE:
-        try:
-            # Fetch the list of countries from the REST Countries API
-            response = requests.get("https://restcountries.com/v3.1/all")
-            response.raise_for_status()  # Raise an error for HTTP issues
-            countries = response.json()
-            # Extract country names and store them in the cache
-            VALID_COUNTRIES_CACHE = [country["name"]["common"] for country in countries if "name" in country and "common" in country["name"]]
-            logging.debug(f"Fetched {len(VALID_COUNTRIES_CACHE)} countries from the API.")
-        except Exception as e:
-            logging.error(f"Failed to fetch countries from API: {str(e)}")
-            VALID_COUNTRIES_CACHE = []  # Fallback to an empty list
-    return VALID_COUNTRIES_CACHE
+    for user_id in USER_STATE.expire():
+        SESSION_LOG.debug("Cleaned up session for user: %s", user_id)
 
 @app.route("/query", methods=["POST"])
 def query():
     try:
-        logging.debug("Received a request at /query endpoint")
+        QUERY_LOG.debug("Received a request at /query endpoint")
         cleanup_sessions()  # Clean up old sessions
         data = request.get_json()
         user_id = data.get("user_id", "default")
         message = data.get("message", "").lower()
 
-        if user_id not in USER_STATE:
-            USER_STATE[user_id] = {"last_active": datetime.now()}
+        state = USER_STATE.touch(user_id)  # Create or refresh the session
 
-        state = USER_STATE[user_id]
-        state["last_active"] = datetime.now()  # Update last active time
+        # Find every intent keyword in one pass over the message
+        intents = INTENT_ROUTER.match(message)
 
         # Handle "bye" to end the session
-        if "bye" in message:
+        if "goodbye" in intents:
             if user_id in USER_STATE:
                 del USER_STATE[user_id]
-                logging.debug(f"Ended session for user: {user_id}")
+                SESSION_LOG.debug("Ended session for user: %s", user_id)
             return jsonify({"response": "Goodbye! Have a great day!", "type": "text"})
 
         # Handle "thanks" or "thank you"
-        if "thanks" in message or "thank you" in message:
+        if "thanks" in intents:
             return jsonify({"response": "You're welcome! Would you like any more assistance?", "type": "text"})
 
         # Handle "no" after an error or assistance prompt
-        if "no" in message:
+        if "decline" in intents:
             if user_id in USER_STATE:
                 del USER_STATE[user_id]
-                logging.debug(f"Ended session for user: {user_id}")
+                SESSION_LOG.debug("Ended session for user: %s", user_id)
             return jsonify({"response": "Goodbye! Have a great day!", "type": "text"})
 
         # Airport selection
-        if "bangalore" in message:
-            state["airport"] = "Bangalore"
-            return jsonify({"response": "You selected Bangalore Airport. Choose an option:", "buttons": ["Transport", "Facilities", "Visa"]})
-        elif "dubai" in message:
-            state["airport"] = "Dubai"
-            return jsonify({"response": "You selected Dubai Airport. Choose an option:", "buttons": ["Transport", "Facilities", "Visa"]})
+        if "airport" in intents:
+            state["airport"] = intents["airport"]
+            return jsonify({"response": f"You selected {state['airport']} Airport. Choose an option:", "buttons": REGISTRY.categories(state["airport"])})
 
         # Ensure an airport is selected before proceeding
         if "airport" not in state:
-            return jsonify({"response": "Please select an airport first:", "buttons": ["Bangalore", "Dubai"]})
+            return jsonify({"response": "Please select an airport first:", "buttons": REGISTRY.names})
 
         # Category selection
-        if "transport" in message:
+        category = intents.get("category")
+        if category == "transport":
             state["query"] = "transport"
-            transport_options = list(SHEETS[state["airport"]]["transport"].keys())
+            transport_options = REGISTRY.transport_options(state["airport"])
             return jsonify({
                 "response": f"What transportation option are you looking for at {state['airport']} Airport?", 
                 "buttons": transport_options
             })
-        elif "facilities" in message:
+        elif category == "facilities":
             state["query"] = "facilities"
             return jsonify({"response": "What facilities are you looking for? (e.g., lounge, spa, shops, restaurants)"})
-        elif "visa" in message:
+        elif category == "visa":
             state["query"] = "visa"
             return jsonify({"response": "Please enter your country name."})
 
@@ -145,12 +273,10 @@ def query():
                 return handle_visa(airport, message)
 
         # Default response if no state is matched
-        response = jsonify({"response": "Which airport do you need assistance with? Bangalore or Dubai?", "buttons": ["Bangalore", "Dubai"]})
-        logging.debug(f"Sending response: {response.get_json()}")
-        return response
+        return jsonify({"response": f"Which airport do you need assistance with? {' or '.join(REGISTRY.names)}?", "buttons": REGISTRY.names})
 
     except Exception as e:
-        logging.error(f"Error: {str(e)}")
+        QUERY_LOG.error("Error: %s", e)
         return jsonify({
             "response": "An error occurred while processing your request. Would you like assistance with something else?",
             "buttons": ["Yes", "No"],
@@ -161,40 +287,55 @@ def query():
 
 def handle_transport(airport, message):
     try:
-        city_data = SHEETS[airport]["transport"]
+        data = AIRPORTS[airport]
+        city_data = data.sheets["transport"]
         message = message.lower()  # Convert message to lowercase for case-insensitive matching
         
-        # Special handling for "train"
-        if "train" in message:
-            key = next((k for k in city_data.keys() if "train" in k.lower()), None)
-            if key:
-                if not city_data[key].empty:
-                    # Extract unique options for dropdowns, splitting by commas
-                    train_data = city_data[key]
-                    locations = pd.concat([
-                        train_data["Departure"],
-                        train_data["Arrival"],
-                        train_data["Halt"]
-                    ]).dropna().str.split(",").explode().str.strip().str.title().unique().tolist()
-                    
-                    # Remove "no stops" and sort the list
-                    unique_locations = [loc for loc in locations if loc.lower() != "no stops"]
-                    unique_locations.sort()
-                    
-                    return jsonify({
-                        "response": "Please select a 'From' and 'To' location.",
-                        "from_options": unique_locations,
-                        "to_options": unique_locations,
-                        "type": "dropdown"
-                    })
-                else:
-                    return jsonify({"response": f"No data available for {key}.", "type": "text"})
-            else:
+        # Special handling for train - including when user has selected from/to locations
+        if "train" in message or message.startswith("from:"):
+            network = data.train_network
+
+            # Handle the case when user has selected locations from dropdown
+            if message.startswith("from:"):
+                parts = message.split("to:")
+                if len(parts) != 2:
+                    return jsonify({"response": "Please select both a 'From' and a 'To' location.", "type": "text"})
+                from_location = parts[0].replace("from:", "").strip()
+                to_location = parts[1].strip()
+                if network is None:
+                    return jsonify({"response": "Train information is not available for this airport.", "type": "text"})
+
+                from_stations = network.resolve(from_location)
+                to_stations = network.resolve(to_location)
+
+                # Trains calling at both stations in order
+                train_ids = network.direct_trains(from_stations, to_stations)
+                if train_ids:
+                    return jsonify({"response": [network.rows[train_id] for train_id in train_ids], "type": "list"})
+
+                # Otherwise look for journeys with one change at an intermediate station
+                journeys = network.connections(from_stations, to_stations)
+                if journeys:
+                    results = [network.describe_connection(journey, from_stations, to_stations) for journey in journeys]
+                    return jsonify({"response": results, "type": "list"})
+
+                return jsonify({"response": f"No trains found from {from_location} to {to_location}.", "type": "text"})
+
+            if network is None:
                 return jsonify({"response": "No transport data found for 'train'.", "type": "text"})
-        
+            if network.empty:
+                return jsonify({"response": "No data available for train.", "type": "text"})
+            return jsonify({
+                "response": "Please select a 'From' and 'To' location.",
+                "from_options": network.stations,
+                "to_options": network.stations,
+                "type": "dropdown"
+            })
+
         # First check for specific transport options using fuzzy matching
-        best_match, score = process.extractOne(message, city_data.keys(), scorer=fuzz.partial_ratio)
-        if score > 70:  # Use a threshold to determine a good match
+        match = data.transport_matcher.extract_one(message, threshold=70)
+        if match:  # Scored above the threshold
+            best_match = match[0]
             df = city_data[best_match]
             if not df.empty:
                 # Exclude fields with missing data
@@ -206,18 +347,9 @@ def handle_transport(airport, message):
             else:
                 return jsonify({"response": f"No {best_match} data found for {airport}.", "type": "text"})
 
-        # If no exact match, search inside all sheets using fuzzy matching
-        found_data = []
-        for key, df in city_data.items():
-            try:
-                if df.apply(lambda row: row.astype(str).str.contains(message, case=False, na=False).any(), axis=1).any():
-                    filtered_rows = df[df.apply(lambda row: row.astype(str).str.contains(message, case=False, na=False).any(), axis=1)]
-                    found_data.extend([
-                        {key: value for key, value in row.items() if pd.notna(value)}
-                        for row in filtered_rows.to_dict(orient="records")
-                    ])
-            except Exception as e:
-                logging.error(f"Error searching in {key}: {str(e)}")
+        # If no exact match, search inside all sheets using the inverted index
+        index = data.transport_index
+        found_data = [index.records[row_id] for row_id in index.search(message)]
         if found_data:
             return jsonify({"response": found_data, "type": "list"})
 
@@ -230,21 +362,16 @@ def handle_transport(airport, message):
         })
 
     except Exception as e:
-        logging.error(f"Error in handle_transport for query '{message}' at {airport} Airport: {str(e)}")
+        QUERY_LOG.error("Error in handle_transport for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": "An error occurred while processing your request. Please try again later.", "type": "text"})
 
 def handle_facilities(airport, message):
     try:
-        df = SHEETS[airport]["facilities"]
+        data = AIRPORTS[airport]
+        df = data.sheets["facilities"]
         message = message.lower()
 
-        def match_row(row):
-            return any(
-                fuzz.partial_ratio(message, str(row[col]).lower()) > 70 or message in str(row[col]).lower()
-                for col in ["Type", "Name"] if col in row
-            )
-
-        filtered_rows = df[df.apply(match_row, axis=1)]
+        filtered_rows = df[data.facility_matcher.match(message)]
         if not filtered_rows.empty:
             excluded_columns = ["description", "airport"]
             filtered_rows = filtered_rows.drop(columns=[col for col in excluded_columns if col in filtered_rows.columns], errors="ignore")
@@ -266,32 +393,25 @@ def handle_facilities(airport, message):
             "type": "text"
         })
     except Exception as e:
-        logging.error(f"Error in handle_facilities for query '{message}' at {airport} Airport: {str(e)}")
+        QUERY_LOG.error("Error in handle_facilities for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": f"An error occurred while searching for facilities: {str(e)}", "type": "text"})
 
 def handle_visa(airport, message):
     try:
-        # Fetch the list of valid countries
-        valid_countries = fetch_valid_countries()
-        if not valid_countries:
-            return jsonify({"response": "Unable to validate country names at the moment. Please try again later.", "type": "text"})
-
-        # Validate if the input is a valid country
-        country = message.strip().title()  # Normalize input
-        if country not in valid_countries:
+        # Validate the input against the bundled country registry
+        country = COUNTRIES.resolve(message)
+        if country is None:
             return jsonify({"response": f"'{message}' is not recognized as a valid country. Please enter a valid country name.", "type": "text"})
 
         # Proceed with visa logic if the input is valid
-        df = SHEETS[airport]["visa"]
-        if not df[df.iloc[:, 1].str.contains(country, case=False, na=False)].empty:
+        eligibility = AIRPORTS[airport].visa_eligibility.get(country, NOT_ELIGIBLE)
+        if eligibility == VISA_ON_ARRIVAL:
             return jsonify({"response": "Hooray! Your passport is granted visa on arrival.", "type": "text"})
-        elif airport == "Dubai":
-            gcc_df = SHEETS[airport]["GCC"]
-            if not gcc_df[gcc_df.iloc[:, 1].str.contains(country, case=False, na=False)].empty:
-                return jsonify({"response": "As your country belongs to the GCC, you do not require a visa to enter.", "type": "text"})
+        elif eligibility == GCC_EXEMPT:
+            return jsonify({"response": "As your country belongs to the GCC, you do not require a visa to enter.", "type": "text"})
         return jsonify({"response": "Unfortunately, your country does not have visa on arrival at this airport.", "type": "text"})
     except Exception as e:
-        logging.error(f"Error in handle_visa for query '{message}' at {airport} Airport: {str(e)}")
+        QUERY_LOG.error("Error in handle_visa for query '%s' at %s Airport: %s", message, airport, e)
         return jsonify({"response": f"An error occurred while checking visa information: {str(e)}", "type": "text"})
 
 @app.route("/")
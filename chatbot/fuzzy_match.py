@@ -0,0 +1,58 @@
+import numpy as np
+from fuzzywuzzy import fuzz, utils
+
+# rapidfuzz scores every choice in one C call when it is installed
+try:
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:
+    rapid_process = None
+
+
+# Fixed set of choice strings, normalised once, that queries are scored
+# against with fuzzywuzzy's partial_ratio. rapidfuzz's partial_ratio searches
+# every alignment exactly, so it never scores a choice more than rounding
+# below fuzzywuzzy's heuristic; one batched rapidfuzz call therefore rules out
+# every choice that cannot beat the cutoff, and only the few left are scored
+# with fuzzywuzzy. Scores, and so existing "score > 70" checks, come out
+# exactly as calling fuzzywuzzy on each choice did.
+class FuzzyMatcher:
+    def __init__(self, choices, processor=None):
+        self.choices = list(choices)
+        self.processor = processor
+        self.keys = [processor(choice) if processor else choice for choice in self.choices]
+
+    def candidates(self, query, cutoff):
+        """Positions of the choices that may score above cutoff."""
+        if rapid_process is None or not self.keys:
+            return range(len(self.keys))
+        bounds = rapid_process.cdist([query], self.keys, scorer=rapid_fuzz.partial_ratio, score_cutoff=cutoff, dtype=np.float32)[0]
+        return np.flatnonzero(bounds > cutoff)
+
+    def scores(self, query, cutoff=0):
+        """Return an int array of the query's score against every choice; those not above cutoff may read 0."""
+        if self.processor:
+            query = self.processor(query)
+        scores = np.zeros(len(self.keys), dtype=int)
+        if not query:
+            return scores
+        for i in self.candidates(query, cutoff):
+            scores[i] = fuzz.partial_ratio(query, self.keys[i])
+        return scores
+
+    def extract(self, query, threshold=70, limit=5):
+        """Return up to limit (choice, score, position) tuples scoring above threshold, best first."""
+        scores = self.scores(query, cutoff=threshold)
+        matches = np.flatnonzero(scores > threshold)
+        # Stable, so ties keep the order of the choices
+        matches = matches[np.argsort(-scores[matches], kind="stable")][:limit]
+        return [(self.choices[i], int(scores[i]), int(i)) for i in matches]
+
+    def extract_one(self, query, threshold=70):
+        """Return the best (choice, score, position) above threshold, or None."""
+        matches = self.extract(query, threshold, limit=1)
+        return matches[0] if matches else None
+
+
+def default_process(text):
+    """fuzzywuzzy's process.extract* normalisation: lowercase, alphanumerics only."""
+    return utils.full_process(text)
@@ -0,0 +1,48 @@
+import re
+
+
+# Intent keywords for /query as (phrase, intent, value). Phrases are matched
+# on whole words, so "no" does not fire inside "know" or "north"; adding a
+# category is a new row here rather than another check in query(). Airport
+# rows are added from the manifest by AirportRegistry.intents().
+INTENT_TABLE = [
+    ("bye", "goodbye", True),
+    ("goodbye", "goodbye", True),
+    ("thanks", "thanks", True),
+    ("thank you", "thanks", True),
+    ("no", "decline", True),
+    ("transport", "category", "transport"),
+    ("transportation", "category", "transport"),
+    ("facilities", "category", "facilities"),
+    ("facility", "category", "facilities"),
+    ("visa", "category", "visa"),
+]
+
+
+# Token trie compiled from the intent table. match() walks the message once,
+# following the trie from every token position, and returns the first value
+# found for each intent.
+class IntentRouter:
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    END = None  # Trie key holding the intents of a complete phrase
+
+    def __init__(self, table):
+        self.trie = {}
+        for phrase, intent, value in table:
+            node = self.trie
+            for token in self.TOKEN_PATTERN.findall(phrase.lower()):
+                node = node.setdefault(token, {})
+            node.setdefault(self.END, []).append((intent, value))
+
+    def match(self, message):
+        tokens = self.TOKEN_PATTERN.findall(message.lower())
+        found = {}
+        for start in range(len(tokens)):
+            node = self.trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                for intent, value in node.get(self.END, ()):
+                    found.setdefault(intent, value)
+        return found
@@ -0,0 +1,180 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+
+# Id of the request being served, attached to every record logged while it runs
+REQUEST_ID = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+# Caller-supplied ids end up in log lines, so only plain tokens are accepted
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+ACCESS_LOG = logging.getLogger("backend.access")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+# Keeps a fraction of the DEBUG records of chosen loggers (and their
+# children); INFO and above always pass. Rates are looked up by the most
+# specific configured logger name.
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved = {}  # Logger name -> rate, filled as names are seen
+
+    def rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            prefix = name
+            while prefix and prefix not in self.rates:
+                prefix = prefix.rpartition(".")[0]
+            rate = self._resolved[name] = self.rates.get(prefix, 1.0)
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+# Hands records to the listener thread without formatting them: the message
+# is only built from its arguments once the record is written, off the
+# request thread. Callers should therefore pass immutable arguments. When the
+# queue is full records are counted and dropped rather than blocking.
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Tracebacks hold the request thread's frames; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def parse_sample_rates(spec):
+    """Parse "backend.query=0.05,backend.transport=0.1" into a dict of rates."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(level="DEBUG", fmt="text", sample_rates=None, queue_size=10000):
+    """Route the root logger through a bounded queue to a background writer; return the queue handler."""
+    writer = logging.StreamHandler(sys.stderr)
+    writer.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(handler.queue, writer)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+def resolve_request_id(supplied):
+    """The caller's request id if it is a plain token, else a new one."""
+    return supplied if REQUEST_ID_PATTERN.match(supplied) else uuid.uuid4().hex
+
+
+def log_access(method, path, status, seconds):
+    ACCESS_LOG.info("%s %s %s %.1fms", method, path, status, seconds * 1000)
+
+
+# Set app.config["ACCESS_LOG"] = False when a server in front already writes the access log
+def init_request_ids(app):
+    """Tag each Flask request with the caller's X-Request-ID, or a new id, echo it back and log the request."""
+    from flask import g, request
+
+    @app.before_request
+    def assign_request_id():
+        REQUEST_ID.set(resolve_request_id(request.headers.get("X-Request-ID", "")))
+        g.access_started = time.perf_counter()
+
+    @app.after_request
+    def echo_request_id(response):
+        response.headers["X-Request-ID"] = REQUEST_ID.get()
+        started = g.pop("access_started", None)
+        if started is not None and app.config.get("ACCESS_LOG", True):
+            log_access(request.method, request.path, response.status_code, time.perf_counter() - started)
+        return response
+
+
+# ASGI counterpart of init_request_ids(), for apps serving routes outside
+# Flask. The chosen id replaces the request's X-Request-ID header, so a Flask
+# app mounted below adopts the same id for the records it logs; that app
+# should have ACCESS_LOG off so each request is logged once, here.
+class RequestLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        supplied = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")
+        request_id = resolve_request_id(supplied)
+        header = (b"x-request-id", request_id.encode("latin-1"))
+        scope = dict(scope, headers=[(k, v) for k, v in scope.get("headers", []) if k != b"x-request-id"] + [header])
+        token = REQUEST_ID.set(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"x-request-id"]
+                message = dict(message, headers=headers + [header])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            log_access(scope["method"], scope["path"], status, time.perf_counter() - started)
+            REQUEST_ID.reset(token)
@@ -0,0 +1,69 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+SESSION_LOG = logging.getLogger("backend.sessions")
+
+
+# Session store kept in order of last activity. Touching a session moves it
+# to the end, so the least recently active sessions are always at the front:
+# expiry pops from the front until it meets a live session, and the size cap
+# evicts from the same end, giving LRU eviction under traffic spikes.
+class SessionStore:
+    def __init__(self, timeout, max_sessions, factory=dict):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self._factory = factory
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Lifetime counts by how sessions started and finished
+        self.created = 0
+        self.ended = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def touch(self, user_id):
+        """Return the state for user_id, creating it if needed, and mark it active."""
+        with self._lock:
+            state = self._sessions.get(user_id)
+            if state is None:
+                state = self._factory()
+                self._sessions[user_id] = state
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    self.evicted += 1
+                    SESSION_LOG.debug("Evicted least recently used session: %s", evicted)
+            else:
+                self._sessions.move_to_end(user_id)
+            state["last_active"] = datetime.now()
+            return state
+
+    def expire(self):
+        """Remove sessions idle for longer than the timeout and return their ids."""
+        cutoff = datetime.now() - self.timeout
+        expired = []
+        with self._lock:
+            while self._sessions:
+                user_id, state = next(iter(self._sessions.items()))
+                if state["last_active"] >= cutoff:
+                    break
+                self._sessions.popitem(last=False)
+                expired.append(user_id)
+            self.expired += len(expired)
+        return expired
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def __getitem__(self, user_id):
+        return self._sessions[user_id]
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            del self._sessions[user_id]
+            self.ended += 1
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,153 @@
+from datetime import datetime, time
+
+import pandas as pd
+
+
+# Helper function to turn a time cell into minutes past midnight
+def to_minutes(value):
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute
+    if isinstance(value, str):
+        for fmt in ("%H:%M:%S", "%H:%M"):
+            try:
+                parsed = datetime.strptime(value.strip(), fmt)
+                return parsed.hour * 60 + parsed.minute
+            except ValueError:
+                continue
+    return None
+
+
+# Train network compiled once from a train sheet. Every train becomes an
+# ordered list of stops (departure, halts, arrival) and every station maps to
+# the trains calling there, so from/to lookups and journeys with one change at
+# an intermediate station are index lookups instead of sheet scans.
+#
+# Records are the sheet's cleaned rows, used to describe journeys; fragments,
+# when given, are their pre-encoded JSON, kept alongside for serving as is.
+class TrainNetwork:
+    IGNORED_STOPS = ["no stops", "none", "na", "n/a"]
+
+    def __init__(self, train_data, records, fragments=None):
+        self.empty = train_data.empty
+        self.departure_col = "Departure" if "Departure" in train_data.columns else next((col for col in train_data.columns if "depart" in col.lower()), train_data.columns[0])
+        self.arrival_col = "Arrival" if "Arrival" in train_data.columns else next((col for col in train_data.columns if "arriv" in col.lower() or "dest" in col.lower()), train_data.columns[1])
+        self.halt_col = "Halt" if "Halt" in train_data.columns else next((col for col in train_data.columns if "halt" in col.lower() or "stop" in col.lower()), None)
+        self.departure_time_col = next((col for col in train_data.columns if "depart" in col.lower() and "time" in col.lower()), None)
+        self.arrival_time_col = next((col for col in train_data.columns if "arriv" in col.lower() and "time" in col.lower()), None)
+        self.number_col = next((col for col in train_data.columns if "train" in col.lower() or "no." in col.lower()), None)
+
+        self.rows = records
+        self.fragments = fragments
+        self.stops = []  # Per train: list of station keys in calling order
+        self.positions = []  # Per train: station key -> index in its stops
+        self.times = []  # Per train: estimated minutes past midnight at each stop
+        self.calls = {}  # Station key -> list of (train id, stop index)
+        self.names = {}  # Station key -> display name
+        for train_id, row in enumerate(train_data.to_dict(orient="records")):
+            stops = []
+            for col in [self.departure_col, self.halt_col, self.arrival_col]:
+                if col is None or pd.isna(row.get(col)):
+                    continue
+                for name in str(row[col]).split(","):
+                    name = name.strip()
+                    station = name.lower()
+                    if not station or station in self.IGNORED_STOPS or station in stops:
+                        continue
+                    self.names.setdefault(station, name.title())
+                    stops.append(station)
+            self.stops.append(stops)
+            self.positions.append({station: i for i, station in enumerate(stops)})
+            self.times.append(self._estimate_times(row, len(stops)))
+            for i, station in enumerate(stops):
+                self.calls.setdefault(station, []).append((train_id, i))
+
+        self.stations = sorted(self.names.values())
+
+    def _estimate_times(self, row, stop_count):
+        # The sheet only has times for the first and last stop; halts are
+        # interpolated evenly between them so connections can be ordered
+        departure = to_minutes(row.get(self.departure_time_col)) if self.departure_time_col else None
+        arrival = to_minutes(row.get(self.arrival_time_col)) if self.arrival_time_col else None
+        if departure is None or arrival is None or stop_count < 2:
+            return [None] * stop_count
+        if arrival < departure:
+            arrival += 24 * 60  # Overnight train
+        return [departure + (arrival - departure) * i / (stop_count - 1) for i in range(stop_count)]
+
+    def resolve(self, location):
+        """Return the station keys matching a location name (exact first, then substring)."""
+        location = location.strip().lower()
+        if location in self.calls:
+            return [location]
+        return [station for station in self.calls if location and location in station]
+
+    def direct_trains(self, from_stations, to_stations):
+        """Return the ids of trains calling at a from station and later at a to station."""
+        train_ids = set()
+        for from_station in from_stations:
+            for train_id, i in self.calls.get(from_station, []):
+                positions = self.positions[train_id]
+                if any(positions.get(to_station, -1) > i for to_station in to_stations):
+                    train_ids.add(train_id)
+        return sorted(train_ids)
+
+    def connections(self, from_stations, to_stations, limit=5):
+        """Return journeys needing one change, as (first id, change station, second id), earliest arrival first."""
+        journeys = {}
+        for from_station in from_stations:
+            if from_station in to_stations:
+                continue
+            for first_id, i in self.calls.get(from_station, []):
+                first_stops = self.stops[first_id]
+                for j in range(i + 1, len(first_stops)):
+                    change = first_stops[j]
+                    if change in to_stations:
+                        continue
+                    reach_change = self.times[first_id][j]
+                    for second_id, k in self.calls.get(change, []):
+                        if second_id == first_id:
+                            continue
+                        positions = self.positions[second_id]
+                        end = next((positions[s] for s in to_stations if positions.get(s, -1) > k), None)
+                        if end is None:
+                            continue
+                        leave_change = self.times[second_id][k]
+                        if reach_change is not None and leave_change is not None and leave_change < reach_change:
+                            continue
+                        arrival = self.times[second_id][end]
+                        journeys.setdefault((first_id, change, second_id), arrival if arrival is not None else float("inf"))
+        ranked = sorted(journeys.items(), key=lambda item: item[1])
+        return [journey for journey, _ in ranked[:limit]]
+
+    def _stop_time(self, train_id, station):
+        # Only the first and last stop have published times
+        i = self.positions[train_id][station]
+        row = self.rows[train_id]
+        if i == 0 and self.departure_time_col:
+            return row.get(self.departure_time_col)
+        if i == len(self.stops[train_id]) - 1 and self.arrival_time_col:
+            return row.get(self.arrival_time_col)
+        return None
+
+    def describe_leg(self, train_id, from_station, to_station):
+        number = self.rows[train_id].get(self.number_col, "") if self.number_col else ""
+        leg = f"Train {number}: {self.names[from_station]}"
+        departure = self._stop_time(train_id, from_station)
+        if departure is not None:
+            leg += f" ({departure})"
+        leg += f" to {self.names[to_station]}"
+        arrival = self._stop_time(train_id, to_station)
+        if arrival is not None:
+            leg += f" ({arrival})"
+        return leg
+
+    def describe_connection(self, journey, from_stations, to_stations):
+        first_id, change, second_id = journey
+        from_station = next(s for s in from_stations if s in self.positions[first_id])
+        to_station = next(s for s in to_stations if s in self.positions[second_id])
+        return {
+            "Journey": f"{self.names[from_station]} to {self.names[to_station]} with a change at {self.names[change]}",
+            "First train": self.describe_leg(first_id, from_station, change),
+            "Change at": self.names[change],
+            "Second train": self.describe_leg(second_id, change, to_station)
+        }
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Mapping
+from datetime import time
+from functools import partial
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+# Snapshot versions kept on disk; older ones are removed after each ingest
+SNAPSHOTS_TO_KEEP = 3
+
+
+# Helper function to convert time objects to strings
+def convert_time(value):
+    if isinstance(value, time):
+        return value.strftime("%H:%M:%S")
+    return value
+
+
+# Helper function to drop missing fields from a record and convert time objects
+def clean_record(row):
+    return {key: convert_time(value) for key, value in row.items() if pd.notna(value)}
+
+
+# Read-only mapping whose values are built by a loader on first access and
+# cached afterwards. Keys are known up front, so listing them loads nothing.
+class LazyDict(Mapping):
+    def __init__(self, loaders):
+        self._loaders = loaders
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        loader = self._loaders[key]
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = loader()
+            return self._values[key]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def loaded(self):
+        """Return the values built so far, without building any."""
+        return dict(self._values)
+
+
+# Helper function to fingerprint the workbook contents
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+# Columnar binary snapshot of the workbook. Every sheet is written once to
+# Parquet in a directory named after the workbook's content hash; workers
+# starting against an unchanged workbook read single sheets from it on demand
+# instead of parsing the whole xlsx. Sheets Parquet cannot represent (e.g.
+# mixed-type columns) are pickled instead.
+class WorkbookSnapshot:
+    def __init__(self, data_file, snapshot_dir):
+        self.data_file = data_file
+        self.snapshot_dir = snapshot_dir
+        self.version = file_digest(data_file)
+        self.directory = os.path.join(snapshot_dir, self.version)
+        if not os.path.isdir(self.directory):
+            self._ingest()
+
+    def _ingest(self):
+        logging.debug(f"Building snapshot {self.version} of {self.data_file}")
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".ingest-", dir=self.snapshot_dir)
+        try:
+            for sheet_name, df in pd.read_excel(self.data_file, sheet_name=None).items():
+                path = os.path.join(staging, quote(sheet_name, safe=""))
+                try:
+                    df.to_parquet(path + ".parquet", index=False)
+                except Exception as e:
+                    logging.debug(f"Pickling sheet '{sheet_name}' instead of Parquet: {str(e)}")
+                    if os.path.exists(path + ".parquet"):
+                        os.remove(path + ".parquet")
+                    df.to_pickle(path + ".pkl")
+            os.chmod(staging, 0o755)
+            # Publish the finished snapshot atomically; if another worker got
+            # there first its copy is identical, so ours is simply dropped
+            os.rename(staging, self.directory)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self._prune()
+
+    def _prune(self):
+        versions = [os.path.join(self.snapshot_dir, name) for name in os.listdir(self.snapshot_dir) if not name.startswith(".")]
+        versions.sort(key=os.path.getmtime, reverse=True)
+        for stale in versions[SNAPSHOTS_TO_KEEP:]:
+            if stale != self.directory:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    def read(self, sheet_name):
+        path = os.path.join(self.directory, quote(sheet_name, safe=""))
+        if os.path.exists(path + ".parquet"):
+            return pd.read_parquet(path + ".parquet")
+        return pd.read_pickle(path + ".pkl")
+
+    def sheet_names(self):
+        return sorted(unquote(name.rpartition(".")[0]) for name in os.listdir(self.directory)
+                      if name.endswith((".parquet", ".pkl")))
+
+
+# Build an airport's sheets from its manifest layout; each sheet is read on first access
+def load_sheets(snapshot, layout):
+    return LazyDict({
+        key: partial(load_sheets, snapshot, value) if isinstance(value, dict) else partial(snapshot.read, value)
+        for key, value in layout.items()
+    })